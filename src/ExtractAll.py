@@ -0,0 +1,115 @@
+import argparse
+import logging
+import os
+import sys
+
+# append the path of this directory
+sys.path.append(".")
+
+from extract import ExtractForRegistration
+from lib import SycamoreCache
+from lib import SycamoreRest
+from lib import SycamoreViews
+from lib import Usernames
+from sds import ExtractFromSycamoreToSDS21
+from sds import ExtractFromSycamoreToSDSClever
+from sds import ExtractStudents
+
+# Output formats and the creators that write them. Each format is written to
+# a subdirectory of the output directory with the same name.
+TARGETS = {
+    'sds21': ExtractFromSycamoreToSDS21.CleverCreator,
+    'clever': ExtractFromSycamoreToSDSClever.CleverCreator,
+    'students': ExtractStudents.StudentCreator,
+    'registration': ExtractForRegistration.RegistrationCreator,
+}
+
+class InvalidOutputDir(Exception):
+    pass
+
+class AllCreator:
+    """Loads the cache once and writes several output formats from it. The
+    creators share the cache and the intermediate results in Views."""
+
+    def __init__(self, args):
+        self.args = args
+        self.targets = args.targets or list(TARGETS)
+
+        if not os.path.exists(args.output_dir):
+            os.mkdir(args.output_dir)
+        elif not os.path.isdir(args.output_dir):
+            raise InvalidOutputDir('output_dir="{}" is not a directory'.format(args.output_dir))
+
+        print('Initializing cache')
+        rest = SycamoreRest.Extract(school_id=args.school_id, token=args.security_token,
+                                    rate=args.rate, burst=args.burst)
+        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=args.cache_dir, reload=args.reload_data,
+                                            refresh=args.refresh_data, resume=args.resume_load,
+                                            memory_map=args.memory_map or SycamoreCache.MEMORY_MAP_ENTITIES)
+        accounts = Usernames.loadAccounts(args.accounts) if args.accounts else None
+        self.views = SycamoreViews.Views(self.sycamore, accounts=accounts)
+
+    def creator(self, target: str):
+        target_args = argparse.Namespace(**vars(self.args))
+        target_args.output_dir = os.path.join(self.args.output_dir, target)
+        return TARGETS[target](target_args, sycamore=self.sycamore, views=self.views)
+
+    def generate(self):
+        for target in self.targets:
+            print('Generating {}'.format(target))
+            self.creator(target).generate()
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Extract Family and School Data in several formats')
+    parser.add_argument('--school', dest='school_id', action='store',
+                        type=int, required=True, help='Sycamore school ID')
+    parser.add_argument('--token', dest='security_token', action='store',
+                        required=True, help='Sycamore security token')
+    parser.add_argument('--cache', dest='cache_dir', action='store',
+                        required=True, help='Cache directory')
+    parser.add_argument('--reload', dest='reload_data', action='store_true',
+                        help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
+    parser.add_argument('--memory-map', dest='memory_map', action='append', metavar='ENTITY',
+                        choices=[entity.name for entity in SycamoreCache.ENTITIES],
+                        help='Entity to memory-map when loading the cache from Arrow files, can be repeated '
+                             '(default: {})'.format(', '.join(SycamoreCache.MEMORY_MAP_ENTITIES)))
+    parser.add_argument('--memory-report', dest='memory_report', action='store_true',
+                        help='Whether to print the memory used by each loaded entity')
+    parser.add_argument('--format', dest='targets', action='append', choices=list(TARGETS),
+                        help='Output format to write, can be repeated (default: all)')
+    parser.add_argument('--xlsx', dest='xlsx_output', action='store_true',
+                        help='use XLS format for the registration output')
+    parser.add_argument('--out', dest='output_dir', action='store',
+                        required=True, help='Output directory')
+    parser.add_argument('--accounts', dest='accounts', action='store',
+                        help='CSV file with the Username and ID of existing accounts')
+    parser.add_argument('--delta', dest='delta_output', action='store_true',
+                        help='Whether to also write the SDS and Clever changes since the last delta run')
+    parser.add_argument('--translations', dest='translations', action='store',
+                        help='JSON file with additional grade, term and relationship translations')
+    parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
+    parser.set_defaults(memory_report=False)
+    parser.set_defaults(delta_output=False)
+    parser.set_defaults(xlsx_output=False)
+    return parser.parse_args()
+
+if __name__ == "__main__" :
+    logging.basicConfig(level=logging.INFO)
+    args = parse_arguments()
+    creator = AllCreator(args)
+    creator.generate()
+    if args.memory_report:
+        creator.sycamore.printMemoryReport()
+    print('Done')
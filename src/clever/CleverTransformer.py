@@ -17,6 +17,7 @@ import pandas as pd
 sys.path.append(".")
 
 from lib import Generators
+from lib import Translations
 
 
 logging.basicConfig(level=logging.WARN)
@@ -77,6 +78,9 @@ class CSVTransformer(ABC):
             data.append(value)
         dataframe.insert(index, name, data)
     
+    def addColumnValues(self, dataframe, index : int, name: str, values: pd.Series):
+        dataframe.insert(index, name, values)
+
     def changeColumnName(self, dataframe, oldName, newName):
         dataframe.rename(columns = {oldName: newName}, inplace=True)
     
@@ -129,8 +133,8 @@ class SIS2SDS(CSVTransformer):
         self.changeColumnName(dataframe, 'Contact_email', 'Email')
 
         # Create Role from Contact_relationship
-        deriveFirst = lambda row: Generators.createRole(row.Contact_relationship)
-        self.addColumnExpr(dataframe, len(columns), 'Role', deriveFirst)
+        self.addColumnValues(dataframe, len(columns), 'Role',
+                             Translations.translateSeries('role', dataframe['Contact_relationship']))
 
         self.dropColumn(dataframe, 'Contact_relationship')
 
@@ -177,11 +181,12 @@ class SIS2SDS(CSVTransformer):
         target = os.path.join(self.targetDir, f'{targetFile}.csv')
         self.saveCSVFile(dataframe, target)
         
-    def createStudentEmailAddress(self, row):
-        return Generators.createStudentEmailAddress(row.First_name, row.Last_name)
+    def createStudentEmailAddresses(self, dataframe):
+        return Generators.createStudentEmailAddresses(dataframe['First_name'], dataframe['Last_name'])
 
-    def createTeacherEmailAddress(self, row):
-        return Generators.createTeacherEmailAddress(row.First_name, row.Last_name, row.Teacher_email)
+    def createTeacherEmailAddresses(self, dataframe):
+        return Generators.createTeacherEmailAddresses(dataframe['First_name'], dataframe['Last_name'],
+                                                      dataframe['Teacher_email'])
         
     def transformStudents(self):
         sourceFile = 'students'
@@ -202,8 +207,7 @@ class SIS2SDS(CSVTransformer):
         self.removeDuplicates(dataframe)
         
         # add missing column and set default value
-        derive = lambda row: self.createStudentEmailAddress(row)
-        self.addColumnExpr(dataframe, 2, 'Username', derive)
+        self.addColumnValues(dataframe, 2, 'Username', self.createStudentEmailAddresses(dataframe))
         
         target = os.path.join(self.targetDir, f'{sourceFile}.csv')
         self.saveCSVFile(dataframe, target)
@@ -245,11 +249,9 @@ class SIS2SDS(CSVTransformer):
         source = os.path.join(self.sourceDir, fileName)
         dataframe = self.loadCSVFileSubset(source, columns)
         
-        deriveUsername = lambda row: self.createTeacherEmailAddress(row)
-        self.addColumnExpr(dataframe, 3, 'Username', deriveUsername)
-
-        deriveEmail = lambda row: self.createTeacherEmailAddress(row)
-        self.addColumnExpr(dataframe, 2, 'Teacher_email_new', deriveEmail)
+        emailAddresses = self.createTeacherEmailAddresses(dataframe)
+        self.addColumnValues(dataframe, 3, 'Username', emailAddresses)
+        self.addColumnValues(dataframe, 2, 'Teacher_email_new', emailAddresses)
         self.dropColumn(dataframe, 'Teacher_email')
         self.changeColumnName(dataframe, 'Teacher_email_new', 'Teacher_email')
         
@@ -289,6 +291,7 @@ class SIS2SDS(CSVTransformer):
         self.transformStudents()
         self.transformUser()
         self.transformParentGuardianRelation()
+        Translations.report()
 
         
         
@@ -8,13 +8,15 @@ import sys
 sys.path.append('..')
 sys.path.append('.')
 
+from lib import Frames
 from lib import Generators
 from lib import SycamoreRest
 from lib import SycamoreCache
+from lib import SycamoreViews
+from lib import Usernames
 
 DATE_FORMAT = '%m/%d/%Y'
 
-SCOPE_GENERAL    = 'Local.General'
 CUSTOM_PHOTO     = 'PhotoRelease'
 CUSTOM_NIKOLAUS  = 'Permission for Nikolaus'
 CUSTOM_ALLERGIES = 'Allergies'
@@ -26,7 +28,7 @@ class InvalidOutputDir(Exception):
 
 class RegistrationCreator:
 
-    def __init__(self, args):
+    def __init__(self, args, sycamore: SycamoreCache.Cache = None, views: SycamoreViews.Views = None):
         self.school_id = args.school_id
         self.cache_dir = args.cache_dir
         self.output_dir = args.output_dir
@@ -37,9 +39,18 @@ class RegistrationCreator:
         elif not os.path.isdir(self.output_dir):
             raise InvalidOutputDir('output_dir="{}" is not a directory'.format(self.output_dir))
 
-        print('Initializing cache')
-        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token)
-        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data)
+        if sycamore is None:
+            print('Initializing cache')
+            rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token,
+                                        rate=args.rate, burst=args.burst)
+            sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data,
+                                           refresh=args.refresh_data, resume=args.resume_load,
+                                           memory_map=args.memory_map or SycamoreCache.MEMORY_MAP_ENTITIES)
+        self.sycamore = sycamore
+        if views is None:
+            accounts = Usernames.loadAccounts(args.accounts) if args.accounts else None
+            views = SycamoreViews.Views(self.sycamore, accounts=accounts)
+        self.views = views
 
     def generate(self):
         print('Generating output')
@@ -71,8 +82,43 @@ class RegistrationCreator:
     def incrString(self, string):
         return "".join(self.incrChar(a) for a in string)
 
+    def _customValues(self) -> pandas.DataFrame:
+        # The custom values of every student, or their default if the student
+        # doesn't have the field. Fields without a value stay empty.
+        defaults = {
+            CUSTOM_PHOTO: 'N',
+            CUSTOM_NIKOLAUS: 'None',
+            CUSTOM_IEP: '',
+            CUSTOM_ALLERGIES: '',
+            }
+        sycStudents = self.sycamore.get('students')
+        customValues = self.sycamore.get('student_custom_values').reindex(
+            index=sycStudents.index, columns=list(defaults)).astype('string')
+        present = self.sycamore.get('student_custom_present').reindex(
+            index=sycStudents.index, columns=list(defaults)).fillna(False).astype(bool)
+        for name, default in defaults.items():
+            customValues[name] = customValues[name].where(present[name], default)
+        return customValues.rename(columns={
+            CUSTOM_PHOTO: 'PhotoRelease',
+            CUSTOM_NIKOLAUS: 'Nikolaus',
+            CUSTOM_IEP: 'IEPor504',
+            CUSTOM_ALLERGIES: 'Allergies',
+            })
+
+    def _primaryParents(self, count: int) -> list:
+        # The first "count" primary parents of each family, as frames indexed
+        # by family ID.
+        sycPrimaryParents = self.views.primaryContacts()
+        position = sycPrimaryParents.groupby('families_id', sort=False).cumcount().to_numpy()
+        return [sycPrimaryParents.loc[position == n].set_index('families_id')[['FirstName', 'LastName', 'Email']]
+                .assign(Found=True)
+                for n in range(count)]
+
+    def _studentEmails(self, rows: pandas.DataFrame):
+        return self.views.allStudentEmails(include_domain=True).loc[rows['studentId'].to_numpy()].to_numpy()
+
     def generateRegistrations(self):
-        registrations = pandas.DataFrame(columns=[
+        columns = [
             'StudentLastName',
             'StudentFirstName',
             'StudentName',
@@ -101,98 +147,80 @@ class RegistrationCreator:
             'TertiaryParentEmail',
             'StreetAddress',
             'CityStateZip'
-        ])
+        ]
 
+        sycStudents = self.sycamore.get('students')
         sycClasses = self.sycamore.get('classes')
         sycClassesDetails = self.sycamore.get('class_details')
         sycEmployees = self.sycamore.get('employees')
         sycFamilies = self.sycamore.get('families')
-        sycFamilyContacts = self.sycamore.get('family_contacts')
-
-        for studentIndex, sycStudent in self.sycamore.get('students').iterrows():
-            #retrieve custom fields for student and final custom values in Local.General area
-            sycCustomFieldList = self.sycamore.get('student_custom_fields')
-            customFields = sycCustomFieldList.loc[sycCustomFieldList['students_id'] == studentIndex]
-            general = customFields[SCOPE_GENERAL].get(studentIndex)
-            photoRelease = next((x['Value'] for i, x in enumerate(general) if x['Name'] == CUSTOM_PHOTO), 'N')
-            nikolaus     = next((x['Value'] for i, x in enumerate(general) if x['Name'] == CUSTOM_NIKOLAUS), 'None')
-            iep          = next((x['Value'] for i, x in enumerate(general) if x['Name'] == CUSTOM_IEP), '')
-            allergies    = next((x['Value'] for i, x in enumerate(general) if x['Name'] == CUSTOM_ALLERGIES), '')
-            
-            try:
-                sycStudentClassesList = self.sycamore.get('student_classes')
-                sycStudentClasses = sycStudentClassesList.loc[sycStudentClassesList['students_id'] == studentIndex]
-            except KeyError:
-                print('Skipping student "{} {}" with no classes'.format(sycStudent['FirstName'], sycStudent['LastName']))
-                continue
-
-            if sycStudentClasses is None:
-                print('Skipping student "{} {}" with empty classes'.format(sycStudent['FirstName'], sycStudent['LastName']))
-                continue
-
-            for studentClassIndex, sycStudentClass in sycStudentClasses.iterrows():
-                registration = {}
-                studentLastName = sycStudent['LastName']
-                registration['StudentLastName'] = studentLastName
-                registration['StudentFirstName'] = sycStudent['FirstName']
-                registration['StudentName'] = Generators.createStudentName(
-                    first_name=sycStudent['FirstName'],
-                    last_name=sycStudent['LastName'])
-                registration['Allergies'] = allergies
-                registration['IEPor504'] = iep
-                registration['Nikolaus'] = nikolaus
-                registration['PhotoRelease'] = photoRelease
-                
-                sycClass = sycClasses.loc[studentClassIndex]
-                sycClassDetails = sycClassesDetails.loc[studentClassIndex]
-                sycPrimaryStaffID = sycClass['PrimaryStaffID']
-                if sycPrimaryStaffID not in sycEmployees.index:
-                    continue
-                
-                sycPrimaryStaff = sycEmployees.loc[sycPrimaryStaffID]
-                registration['Class'] = Generators.createClassName(
-                    class_name=sycStudentClass['Name'],
-                    teacher_first=sycPrimaryStaff['FirstName'],
-                    teacher_last=sycPrimaryStaff['LastName'])
-                registration['Room'] = sycClassDetails['Facility.Name']
-                registration['TeacherLastName'] = sycPrimaryStaff['LastName']
-                registration['TeacherFirstName'] = sycPrimaryStaff['FirstName']
-                registration['TeacherName'] = Generators.createTeacherName(
-                    first_name=sycPrimaryStaff['FirstName'],
-                    last_name=sycPrimaryStaff['LastName'])
-                registration['StudentGSSBEmail'] = Generators.createStudentEmailAddress(
-                    sycStudent['FirstName'], sycStudent['LastName'], include_domain=True)
-                sycFamilyId = sycStudent['FamilyID']
-                sycFamily = sycFamilies.loc[sycFamilyId]
-                registration['FamilyCode'] = sycFamily['Code']
-                registration['StudentCode'] = sycStudent['StudentCode']
-                registration['LingcoPwd'] = self.incrString(sycStudent['StudentCode'])
-                sycStudentFamilyContacts = sycFamilyContacts.loc[sycFamilyContacts['families_id'] == sycFamilyId]
-                sycStudentPrimaryParents = sycStudentFamilyContacts.loc[sycStudentFamilyContacts['PrimaryParent'] == 1]
-                if len(sycStudentPrimaryParents) > 0:
-                    primaryParentLastName = sycStudentPrimaryParents.iloc[0]['LastName']
-                    registration['Parent1LastName'] = primaryParentLastName
-                    registration['Parent1FirstName'] = sycStudentPrimaryParents.iloc[0]['FirstName']
-                    registration['PrimaryParentEmail'] = sycStudentPrimaryParents.iloc[0]['Email']
-                    if primaryParentLastName != studentLastName:
-                        registration['StudentLastNameIfDifferent1'] = studentLastName
-                if len(sycStudentPrimaryParents) > 1:
-                    secondaryParentLastName = sycStudentPrimaryParents.iloc[1]['LastName']
-                    registration['Parent2LastName'] = secondaryParentLastName
-                    registration['Parent2FirstName'] = sycStudentPrimaryParents.iloc[1]['FirstName']
-                    registration['SecondaryParentEmail'] = sycStudentPrimaryParents.iloc[1]['Email']
-                    if secondaryParentLastName != studentLastName:
-                        registration['StudentLastNameIfDifferent2'] = studentLastName
-                if len(sycStudentPrimaryParents) > 2:
-                    # osk: Whatever other e-mail address is left over (likely non-primary).
-                    registration['TertiaryParentEmail'] = sycStudentPrimaryParents.iloc[2]['Email']
-                registration['ParentNames'] = sycFamily['Name']
-                registration['StreetAddress'] = sycFamily['Address']
-                registration['CityStateZip'] = Generators.createCityStateZip(sycFamily['City'], sycFamily['State'], sycFamily['ZIP'])
-
-                registrations.loc[str(studentIndex) + '_' + str(studentClassIndex)] = pandas.Series(data=registration)
-
-        return registrations
+
+        # One row per student and class, in the order of 'students'
+        sycStudentClasses = Frames.orderBy(self.sycamore.get('student_classes'), 'students_id', sycStudents.index)
+        rows = pandas.DataFrame({
+            'studentId': sycStudentClasses['students_id'].to_numpy(),
+            'classId': sycStudentClasses.index,
+            'className': sycStudentClasses['Name'].to_numpy(),
+            })
+        rows = rows.merge(sycClasses[['PrimaryStaffID']], how='left', left_on='classId', right_index=True)
+        rows = rows.merge(sycClassesDetails[['Facility.Name']], how='left', left_on='classId', right_index=True)
+
+        # Skip classes without a known teacher
+        rows = rows.loc[rows['PrimaryStaffID'].isin(sycEmployees.index).to_numpy()]
+        teachers = sycEmployees.loc[rows['PrimaryStaffID']]
+        rows = rows.assign(teacherFirstName=teachers['FirstName'].to_numpy(),
+                           teacherLastName=teachers['LastName'].to_numpy())
+
+        students = sycStudents[['FirstName', 'LastName', 'FamilyID', 'StudentCode']].join(self._customValues())
+        rows = rows.merge(students, how='left', left_on='studentId', right_index=True)
+        families = sycFamilies[['Code', 'Name', 'Address', 'City', 'State', 'ZIP']].add_prefix('family')
+        rows = rows.merge(families, how='left', left_on='FamilyID', right_index=True)
+        for n, parents in enumerate(self._primaryParents(3)):
+            rows = rows.merge(parents.add_prefix('parent{}'.format(n + 1)), how='left',
+                              left_on='FamilyID', right_index=True)
+
+        registrations = pandas.DataFrame({
+            'StudentLastName': rows['LastName'].to_numpy(),
+            'StudentFirstName': rows['FirstName'].to_numpy(),
+            'StudentName': [Generators.createStudentName(first_name=firstName, last_name=lastName)
+                            for firstName, lastName in zip(rows['FirstName'], rows['LastName'])],
+            'Allergies': rows['Allergies'].to_numpy(),
+            'IEPor504': rows['IEPor504'].to_numpy(),
+            'Nikolaus': rows['Nikolaus'].to_numpy(),
+            'PhotoRelease': rows['PhotoRelease'].to_numpy(),
+            'Class': [Generators.createClassName(class_name=className, teacher_first=firstName, teacher_last=lastName)
+                      for className, firstName, lastName in zip(rows['className'], rows['teacherFirstName'], rows['teacherLastName'])],
+            'Room': rows['Facility.Name'].to_numpy(),
+            'TeacherLastName': rows['teacherLastName'].to_numpy(),
+            'TeacherFirstName': rows['teacherFirstName'].to_numpy(),
+            'TeacherName': [Generators.createTeacherName(first_name=firstName, last_name=lastName)
+                            for firstName, lastName in zip(rows['teacherFirstName'], rows['teacherLastName'])],
+            'StudentGSSBEmail': self._studentEmails(rows),
+            'FamilyCode': rows['familyCode'].to_numpy(),
+            'StudentCode': rows['StudentCode'].to_numpy(),
+            'LingcoPwd': [self.incrString(studentCode) for studentCode in rows['StudentCode']],
+            'Parent1LastName': rows['parent1LastName'].to_numpy(),
+            'Parent1FirstName': rows['parent1FirstName'].to_numpy(),
+            'Parent2LastName': rows['parent2LastName'].to_numpy(),
+            'Parent2FirstName': rows['parent2FirstName'].to_numpy(),
+            'ParentNames': rows['familyName'].to_numpy(),
+            'PrimaryParentEmail': rows['parent1Email'].to_numpy(),
+            'SecondaryParentEmail': rows['parent2Email'].to_numpy(),
+            'TertiaryParentEmail': rows['parent3Email'].to_numpy(),
+            'StreetAddress': rows['familyAddress'].to_numpy(),
+            'CityStateZip': [Generators.createCityStateZip(city, state, zipcode)
+                             for city, state, zipcode in zip(rows['familyCity'], rows['familyState'], rows['familyZIP'])],
+            })
+        # The student's last name, if the family has that parent and the
+        # parent's last name is different.
+        for n in (1, 2):
+            hasParent = rows['parent{}Found'.format(n)].notna()
+            different = hasParent & (rows['parent{}LastName'.format(n)] != rows['LastName'])
+            registrations['StudentLastNameIfDifferent{}'.format(n)] = rows['LastName'].where(different).to_numpy()
+
+        keys = [str(studentIndex) + '_' + str(studentClassIndex)
+                for studentIndex, studentClassIndex in zip(rows['studentId'], rows['classId'])]
+        return Frames.upsert([(keys, registrations)], columns)
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Extract Family and School Data')
@@ -204,11 +232,32 @@ def parse_arguments():
                         required=True, help='Cache directory')
     parser.add_argument('--reload', dest='reload_data', action='store_true',
                         help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
+    parser.add_argument('--memory-map', dest='memory_map', action='append', metavar='ENTITY',
+                        choices=[entity.name for entity in SycamoreCache.ENTITIES],
+                        help='Entity to memory-map when loading the cache from Arrow files, can be repeated '
+                             '(default: {})'.format(', '.join(SycamoreCache.MEMORY_MAP_ENTITIES)))
+    parser.add_argument('--memory-report', dest='memory_report', action='store_true',
+                        help='Whether to print the memory used by each loaded entity')
+    parser.add_argument('--accounts', dest='accounts', action='store',
+                        help='CSV file with the Username and ID of existing accounts')
     parser.add_argument('--xlsx', dest='xlsx_output', action='store_true',
                         help='use XLS format as output')
     parser.add_argument('--out', dest='output_dir', action='store',
                         required=True, help='Output directory')
     parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
+    parser.set_defaults(memory_report=False)
     parser.set_defaults(xlsx_output=False)
     return parser.parse_args()
 
@@ -217,5 +266,7 @@ if __name__ == '__main__' :
     args = parse_arguments()
     creator = RegistrationCreator(args)
     creator.generate()
+    if args.memory_report:
+        creator.sycamore.printMemoryReport()
     print('Done')
 
@@ -23,8 +23,10 @@ class RegistrationCreator:
         self.cache_dir = args.cache_dir
 
         print('Initializing cache')
-        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token)
-        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data)
+        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token,
+                                    rate=args.rate, burst=args.burst)
+        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data,
+                                            refresh=args.refresh_data, resume=args.resume_load)
 
     # 
     # Basic Validation Logic
@@ -136,7 +138,6 @@ class RegistrationCreator:
         print('Validating data')
         studentFamilies = set()
         classesWithStudents = set()
-        studentClassesList = self.sycamore.get('student_classes')
         students = self.sycamore.get('students')
         for id, student in students.iterrows():
             # keep note of student family
@@ -146,16 +147,8 @@ class RegistrationCreator:
             self.check_NoSpacesInStudentLastName(student)
             self.check_UnexpectedCharactersInStudentName(student)
             
-            try:
-                studentClasses = studentClassesList.loc[studentClassesList['students_id'] == id]
-            except KeyError:
-                print('Skipping student "{} {}" with no classes'.format(student['FirstName'], student['LastName']))
-                continue
-
-            if studentClasses is None:
-                print('Skipping student "{} {}" with empty classes'.format(student['FirstName'], student['LastName']))
-                continue
-            elif (len(studentClasses.index)==1):
+            studentClasses = self.sycamore.children('student_classes', id)
+            if (len(studentClasses.index)==1):
                 classesWithStudents.add(studentClasses.index[0])
                 
                         
@@ -193,7 +186,19 @@ def parse_arguments():
                         required=True, help='Cache directory')
     parser.add_argument('--reload', dest='reload_data', action='store_true',
                         help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
     parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
     return parser.parse_args()
 
 if __name__ == '__main__' :
@@ -0,0 +1,58 @@
+import numpy
+import pandas
+
+##
+
+def truthy(series: pandas.Series) -> pandas.Series:
+    """Element-wise bool(), e.g. '' and None are False, but NaN is True."""
+    return pandas.Series([bool(value) for value in series], index=series.index, dtype=bool)
+
+def firstPositions(values) -> dict:
+    """Maps each value to the position of its first occurrence."""
+    positions = {}
+    for position, value in enumerate(values):
+        positions.setdefault(value, position)
+    return positions
+
+def orderBy(frame: pandas.DataFrame, column: str, values) -> pandas.DataFrame:
+    """Returns the rows of frame whose column is in values, ordered by the
+    position of their value in values. The order of rows with the same value
+    is kept."""
+    positions = firstPositions(values)
+    frame = frame.loc[frame[column].isin(list(positions)).to_numpy()]
+    order = frame[column].map(positions).to_numpy()
+    return frame.iloc[numpy.argsort(order, kind='stable')]
+
+def upsert(parts: list, columns: list) -> pandas.DataFrame:
+    """Combines (keys, frame) pairs into one frame with the given columns, like
+    assigning every row with frame.loc[key] = row would: a key that occurs
+    again replaces the values of the earlier row, but keeps its position.
+
+    All columns are of type object, so values are written as they are, e.g.
+    integer IDs don't turn into floats next to missing values."""
+    frames = []
+    for keys, part in parts:
+        part = part.reindex(columns=columns).astype(object)
+        part.index = pandas.Index(list(keys), dtype=object)
+        frames.append(part)
+    if not frames:
+        return pandas.DataFrame(columns=columns)
+
+    combined = pandas.concat(frames)
+    last = combined.loc[~combined.index.duplicated(keep='last')]
+    return last.reindex(combined.index[~combined.index.duplicated(keep='first')])
+
+def chunks(values, size: int):
+    """Splits values into consecutive parts of (at most) size values. Yields
+    at least one, possibly empty, part."""
+    for start in range(0, max(len(values), 1), size):
+        yield values[start:start + size]
+
+def batches(frame: pandas.DataFrame, column: str, values, size: int):
+    """Splits a frame returned by orderBy(frame, column, values) into
+    consecutive parts, each with the rows of (at most) size values. Yields
+    at least one, possibly empty, part."""
+    order = frame[column].map(firstPositions(values)).to_numpy()
+    for start in range(0, max(len(values), 1), size):
+        first, last = numpy.searchsorted(order, [start, start + size], side='left')
+        yield frame.iloc[first:last]
@@ -1,7 +1,15 @@
+import collections
 from datetime import datetime
 from datetime import timedelta
+import json
 import logging
+import numpy
+import os
+import pandas
 import phonenumbers
+import threading
+
+from lib import Translations
 
 STUDENT_DOMAIN = '@student.gssb.org'
 TEACHER_DOMAIN = '@gssb.org'
@@ -62,6 +70,58 @@ def createTeacherEmailAddress(first_name: str, last_name: str, email: str, inclu
 
     return __createEmailAddress(first_name, last_name, TEACHER_DOMAIN if include_domain else '')
 
+# The same formatting as __formatFirstName() and __formatLastName(), for a
+# whole Series of names at once.
+_FIRST_NAME_TRANSLATION = str.maketrans({' ': None, '\'': None, '"': None})
+_LAST_NAME_TRANSLATION = str.maketrans({'\'': None, 'ä': 'ae', 'ö': 'oe', 'ü': 'ue', 'ß': 'ss'})
+
+def __formatFirstNames(names: pandas.Series) -> pandas.Series:
+    return names.str.strip().str.translate(_FIRST_NAME_TRANSLATION)
+
+def __formatLastNames(names: pandas.Series) -> pandas.Series:
+    names = names.str.strip().str.translate(_LAST_NAME_TRANSLATION)
+
+    # Particles that are joined with the name instead of with a dash, in the
+    # order __formatLastName() checks them.
+    joined = (names.str[:4].isin(['van ', 'Van ', 'von ', 'Von ']).to_numpy(),
+              names.str.startswith('Freiin von ', na=False).to_numpy(),
+              (names.str.contains(' zu ', regex=False, na=False)
+               | names.str.contains(' Zu ', regex=False, na=False)
+               | names.str.startswith('de ', na=False)
+               | names.str.startswith('De ', na=False)
+               | names.str.contains(' Nguyen', regex=False, na=False)
+               | names.str.contains(' nguyen', regex=False, na=False)).to_numpy())
+    without_spaces = names.str.replace(' ', '', regex=False).to_numpy(dtype=object)
+    freiin = (names.str.replace('Freiin von ', 'Von', regex=False)
+              .str.replace(' ', '-', regex=False).to_numpy(dtype=object))
+    with_dashes = names.str.replace(' ', '-', regex=False).to_numpy(dtype=object)
+    return pandas.Series(numpy.select(joined, [without_spaces, freiin, without_spaces], default=with_dashes),
+                         index=names.index, dtype=object)
+
+def __createEmailAddresses(first_names: pandas.Series, last_names: pandas.Series, domain: str) -> pandas.Series:
+    return (__formatFirstNames(first_names) + '.'
+            + __formatLastNames(last_names).to_numpy()
+            + domain)
+
+def createStudentEmailAddresses(first_names: pandas.Series, last_names: pandas.Series,
+                                include_domain: bool = True) -> pandas.Series:
+    """createStudentEmailAddress() for whole Series of first and last names."""
+    return __createEmailAddresses(first_names, last_names, STUDENT_DOMAIN if include_domain else '')
+
+def createTeacherEmailAddresses(first_names: pandas.Series, last_names: pandas.Series, emails: pandas.Series,
+                                include_domain: bool = True) -> pandas.Series:
+    """createTeacherEmailAddress() for whole Series of first and last names and
+    e-mail addresses."""
+    emails = emails.str.strip()
+    if not include_domain:
+        own_emails = emails.str.replace('@gssb.org', '', regex=False)
+    else:
+        own_emails = emails
+    created = __createEmailAddresses(first_names, last_names, TEACHER_DOMAIN if include_domain else '')
+    has_own = emails.str.endswith('@gssb.org', na=False).to_numpy()
+    return pandas.Series(numpy.where(has_own, own_emails.to_numpy(dtype=object), created.to_numpy(dtype=object)),
+                         index=emails.index, dtype=object)
+
 def createStudentName(first_name: str, last_name: str) -> str:
     return last_name + ', ' + first_name
 
@@ -79,34 +139,8 @@ def createClassName(class_name: str, teacher_first: str, teacher_last: str) -> s
         result = result.replace('/', '.')
     return result
 
-GRADE_MAP = {
-    'Preschool': 'Prekindergarten',
-    'Kindergarten': 'Kindergarten',
-    '1st': '1',
-    '2nd': '2',
-    '3rd': '3',
-    '4th': '4',
-    '5th': '5',
-    '6th': '6',
-    '7th': '7',
-    '8th': '8',
-    '9th - DSD 1': '9',
-    '10th - DSD 2 y1': '10',
-    '11th - DSD 2 y2': '11',
-    '10th (no DSD 2)': '12',
-}
-
 def createGrade(sycamore_grade: str) -> str:
-
-    if sycamore_grade is None:
-        logging.warn("Translating None grade to ''.")
-        return ''
-
-    if sycamore_grade in GRADE_MAP:
-        return GRADE_MAP[sycamore_grade]
-
-    logging.warn("Could not translate grade '" + sycamore_grade + "'.")
-    return sycamore_grade
+    return Translations.translate('grade', sycamore_grade)
 
 def createSectionName(sycamore_class_name: str, sycamore_section: str) -> str:
     if not sycamore_section:
@@ -114,15 +148,7 @@ def createSectionName(sycamore_class_name: str, sycamore_section: str) -> str:
     return str(sycamore_class_name) + '-' + str(sycamore_section)
 
 def createTermName(sycamore_term_name: str):
-    if sycamore_term_name == 'First':
-        return 'S1'
-    if sycamore_term_name == 'Second':
-        return 'S2'
-    if sycamore_term_name == 'Full Year':
-        return 'Year'
-
-    logging.warn("Could not translate term '" + sycamore_term_name + "'.")
-    return sycamore_term_name
+    return Translations.translate('term', sycamore_term_name)
 
 def createTermStart(sycamore_term_name: str, s1_start: datetime.date, s2_start: datetime.date, _year_end: datetime.date) -> datetime.date:
     if sycamore_term_name == 'First':
@@ -146,15 +172,8 @@ def createTermEnd(sycamore_term_name: str, s1_start: datetime.date, s2_start: da
     logging.warn("Could not translate term '" + sycamore_term_name + "'.")
     return None
 
-NAME_TO_PERIOD_MAP = {
-    'Beginner\'s Class': 'Adlt',
-    'Conversation Class German': 'Adlt',
-}
-
 def createPeriod(sycamore_class_name: str) -> str:
-    if sycamore_class_name in NAME_TO_PERIOD_MAP:
-        return NAME_TO_PERIOD_MAP[sycamore_class_name]
-    return 'GP'
+    return Translations.translate('period', sycamore_class_name)
 
 def createTeacherId(sycamore_primary_staff_id: str) -> str:
     if not sycamore_primary_staff_id or sycamore_primary_staff_id == '0':
@@ -162,115 +181,13 @@ def createTeacherId(sycamore_primary_staff_id: str) -> str:
     return sycamore_primary_staff_id
 
 def createRole(sycamore_relationship: str):
-    if not isinstance(sycamore_relationship, str):
-        # Default value
-        return 'Parent'
-
-    sycamore_relationship = sycamore_relationship.strip()
-
-    if sycamore_relationship == 'Mother':
-        return 'Parent'
-    if sycamore_relationship == 'Father':
-        return 'Parent'
-    if sycamore_relationship == 'Parents':
-        return 'Parent'
-    if sycamore_relationship == 'Grandmother':
-        return 'Relative'
-    if sycamore_relationship == '':
-        return 'Parent'
-    if sycamore_relationship == 'Aunt':
-        return 'Relative'
-    if sycamore_relationship == 'Close Friend':
-        return 'Other'
-    if sycamore_relationship == 'Colleague':
-        return 'Other'
-    if sycamore_relationship == 'Grandfather':
-        return 'Relative'
-    if sycamore_relationship == 'Grandparents':
-        return 'Relative'
-    if sycamore_relationship == 'Nanny':
-        return 'Aide'
-    if sycamore_relationship == 'Not Defined':
-        return 'Other'
-    if sycamore_relationship == 'Relative':
-        return 'Relative'
-    if sycamore_relationship == 'Sibling':
-        return 'Relative'
-    if sycamore_relationship == 'Uncle':
-        return 'Relative'
-
-    print('Unsupported relationship "%s"' % (sycamore_relationship))
-    return 'Parent'
+    return Translations.translate('role', sycamore_relationship)
 
 def createUserRole(sycamore_employee_position: str, sycamore_employee_id: str):
-    if not isinstance(sycamore_employee_position, str):
-        # Default value
-        return 'teacher'
-
-    sycamore_employee_position = sycamore_employee_position.strip()
-
-    if sycamore_employee_position == 'Teacher':
-        return 'teacher'
-    if sycamore_employee_position == 'Substitute':
-        return 'substitute'
-
-    print('Unsupported employee position "%s" for employeee "%s"' %
-        (sycamore_employee_position, sycamore_employee_id))
-    return 'other'
+    return Translations.translate('user_role', sycamore_employee_position, sycamore_employee_id)
 
 def createRelationshipRole(sycamore_relationship: str, sycamore_contact_id: str):
-    if not isinstance(sycamore_relationship, str):
-        # Default value
-        return 'parent'
-
-    sycamore_relationship = sycamore_relationship.strip()
-
-    if sycamore_relationship == 'Mother':
-        return 'parent'
-    if sycamore_relationship == 'Father':
-        return 'parent'
-    if sycamore_relationship == 'Stepmother':
-        return 'parent'
-    if sycamore_relationship == 'Stepfather':
-        return 'parent'
-    if sycamore_relationship == 'Parents':
-        return 'parent'
-    if sycamore_relationship == 'Grandmother':
-        return 'relative'
-    if sycamore_relationship == '':
-        return 'parent'
-    if sycamore_relationship == 'Aunt':
-        return 'relative'
-    if sycamore_relationship == 'Close Friend':
-        return 'other'
-    if sycamore_relationship == 'Colleague':
-        return 'other'
-    if sycamore_relationship == 'Grandfather':
-        return 'relative'
-    if sycamore_relationship == 'Grandparents':
-        return 'relative'
-    if sycamore_relationship == 'Nanny':
-        return 'aide'
-    if sycamore_relationship == 'Not Defined':
-        return 'other'
-    if sycamore_relationship == 'Relative':
-        return 'relative'
-    if sycamore_relationship == 'Sibling':
-        return 'relative'
-    if sycamore_relationship == 'Uncle':
-        return 'relative'
-    if sycamore_relationship == 'Partner':
-        return 'guardian'
-    if sycamore_relationship == 'DayCare Provider':
-        return 'aide'
-    if sycamore_relationship == 'Helper':
-        return 'aide'
-    if sycamore_relationship == 'Student':
-        return 'other'
-
-    print('Unknown relationship "%s" for contact "%s"' %
-        (sycamore_relationship, sycamore_contact_id))
-    return 'other'
+    return Translations.translate('relationship_role', sycamore_relationship, sycamore_contact_id)
 
 def createPhoneNumber(phone: str) -> str:
     return (
@@ -280,14 +197,84 @@ def createPhoneNumber(phone: str) -> str:
           .replace(" ","")
           .strip())
 
-def createE164PhoneNumber(phone: str, sycamore_contact_id: str) -> str:
+# Number of raw phone numbers whose E.164 form is kept in memory, and saved
+# by savePhoneNumberMemo().
+PHONE_CACHE_SIZE = 4096
+# Name of the file in the cache directory that keeps the E.164 form of the
+# phone numbers seen, so later runs don't have to parse them again.
+PHONE_MEMO_FILE = 'phone_numbers.json'
+
+# Raw phone number -> E.164 form (None if invalid), the least recently used
+# first, see loadPhoneNumberMemo().
+_phone_memo = collections.OrderedDict()
+_phone_memo_lock = threading.Lock()
+
+def _parseE164PhoneNumber(phone: str) -> str:
     try:
         parsed_phone = phonenumbers.parse(phone, region="US")
     except phonenumbers.phonenumberutil.NumberParseException:
         parsed_phone = None
 
     if not parsed_phone or not phonenumbers.is_valid_number(parsed_phone):
-        print('Invalid phone number format "%s" for contact "%s"' % (phone, sycamore_contact_id))
         return None
 
     return phonenumbers.format_number(parsed_phone, num_format=phonenumbers.PhoneNumberFormat.E164)
+
+def _rememberPhoneNumber(phone: str, e164_phone: str):
+    with _phone_memo_lock:
+        _phone_memo[phone] = e164_phone
+        _phone_memo.move_to_end(phone)
+        while len(_phone_memo) > PHONE_CACHE_SIZE:
+            _phone_memo.popitem(last=False)
+
+def _toE164PhoneNumber(phone: str) -> str:
+    if not isinstance(phone, str):
+        return _parseE164PhoneNumber(phone)
+    with _phone_memo_lock:
+        if phone in _phone_memo:
+            _phone_memo.move_to_end(phone)
+            return _phone_memo[phone]
+    e164_phone = _parseE164PhoneNumber(phone)
+    _rememberPhoneNumber(phone, e164_phone)
+    return e164_phone
+
+def createE164PhoneNumber(phone: str, sycamore_contact_id: str) -> str:
+    e164_phone = _toE164PhoneNumber(phone)
+    if e164_phone is None:
+        print('Invalid phone number format "%s" for contact "%s"' % (phone, sycamore_contact_id))
+    return e164_phone
+
+def createE164PhoneNumbers(phones: pandas.Series, sycamore_contact_ids) -> pandas.Series:
+    """createE164PhoneNumber() for a whole Series of phone numbers, parsing
+    every distinct number only once."""
+    e164_phones = {}
+    result = []
+    for phone, sycamore_contact_id in zip(phones, sycamore_contact_ids):
+        if phone not in e164_phones:
+            e164_phones[phone] = _toE164PhoneNumber(phone)
+        if e164_phones[phone] is None:
+            print('Invalid phone number format "%s" for contact "%s"' % (phone, sycamore_contact_id))
+        result.append(e164_phones[phone])
+    return pandas.Series(result, index=phones.index, dtype=object)
+
+def loadPhoneNumberMemo(directory: str):
+    """Adds the phone numbers saved by savePhoneNumberMemo() to the memo. They
+    are only used if they were parsed with the same phonenumbers version,
+    since its metadata decides which numbers are valid."""
+    path = os.path.join(directory, PHONE_MEMO_FILE)
+    if not os.path.exists(path):
+        return
+    with open(path, 'r') as memo_file:
+        memo = json.load(memo_file)
+    if memo.get('version') == phonenumbers.__version__:
+        for phone, e164_phone in memo['numbers'].items():
+            _rememberPhoneNumber(phone, e164_phone)
+
+def savePhoneNumberMemo(directory: str):
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, PHONE_MEMO_FILE)
+    with open(path + '.tmp', 'w') as memo_file:
+        with _phone_memo_lock:
+            numbers = dict(_phone_memo)
+        json.dump({'version': phonenumbers.__version__, 'numbers': numbers}, memo_file)
+    os.replace(path + '.tmp', path)
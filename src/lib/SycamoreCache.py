@@ -2,28 +2,123 @@ from __future__ import annotations
 
 from lib import SycamoreRest
 from lib import SycamoreEntity
+from lib import SycamoreStorage
+import asyncio
+import concurrent.futures
+import datetime
+import json
+import numpy
 import pandas
 import os
+import shutil
+import threading
+import time
 
 ##           
 
+# How long cached entities stay valid. Class enrollments change most often,
+# school years hardly ever.
+_HOURS = datetime.timedelta(hours=6)
+_DAY = datetime.timedelta(days=1)
+_WEEK = datetime.timedelta(weeks=1)
+_MONTH = datetime.timedelta(weeks=4)
+
 ENTITIES = [
-    SycamoreEntity.Definition(name='school', index_col=None, url='/School/{school_id}'),
-    SycamoreEntity.Definition(name='families', index_col='ID', url='/School/{school_id}/Families'),
-    SycamoreEntity.Definition(name='family_contacts', index_col='ID', url='/Family/{entity_id}/Contacts', iterate_over='families'),
-    SycamoreEntity.Definition(name='family_details', index_col=None, url='/Family/{entity_id}', iterate_over='families'),
-    SycamoreEntity.Definition(name='family_students', index_col='ID', url='/Family/{entity_id}/Students', iterate_over='families'),
-    SycamoreEntity.Definition(name='students', index_col='ID', url='/School/{school_id}/Students'),
-    SycamoreEntity.Definition(name='student_classes', index_col='ID', url='/Student/{entity_id}/Classes?quarter=0&format=1', iterate_over='students'),
-    SycamoreEntity.Definition(name='student_details', index_col=None, url='/Student/{entity_id}', iterate_over='students'),
-    SycamoreEntity.Definition(name='student_custom_fields', index_col=None, url='/Student/{entity_id}/Statistics', iterate_over='students'),
-    SycamoreEntity.Definition(name='contacts', index_col='ID', url='/School/{school_id}/Contacts'),
-    SycamoreEntity.Definition(name='classes', index_col='ID', url='/School/{school_id}/Classes?quarter=0', data_location='Period'),
-    SycamoreEntity.Definition(name='class_details', index_col=None, url='/School/{school_id}/Classes/{entity_id}', iterate_over='classes'),
-    SycamoreEntity.Definition(name='class_students', index_col='ID', url='/Class/{entity_id}/Directory', iterate_over='classes'),
-    SycamoreEntity.Definition(name='employees', index_col='ID', url='/School/{school_id}/Employees'),
-    SycamoreEntity.Definition(name='years', index_col='ID', url='/School/{school_id}/Years'),
-    SycamoreEntity.Definition(name='years_details', index_col=None, url='/School/{school_id}/Years/{entity_id}', iterate_over='years'),
+    SycamoreEntity.Definition(name='school', index_col=None, url='/School/{school_id}', ttl=_WEEK),
+    SycamoreEntity.Definition(name='families', index_col='ID', url='/School/{school_id}/Families', ttl=_DAY),
+    SycamoreEntity.Definition(name='family_contacts', index_col='ID', url='/Family/{entity_id}/Contacts', iterate_over='families', ttl=_DAY,
+                              dtypes={'PrimaryParent': 'bool', 'Relation': 'category'},
+                              columns=['FirstName', 'LastName', 'Email', 'CellPhone', 'WorkPhone', 'HomePhone', 'Relation', 'PrimaryParent']),
+    SycamoreEntity.Definition(name='family_details', index_col=None, url='/Family/{entity_id}', iterate_over='families', ttl=_DAY,
+                              columns=['Name', 'Code', 'Address', 'City', 'State', 'ZIP']),
+    SycamoreEntity.Definition(name='family_students', index_col='ID', url='/Family/{entity_id}/Students', iterate_over='families', ttl=_DAY),
+    SycamoreEntity.Definition(name='students', index_col='ID', url='/School/{school_id}/Students', ttl=_DAY,
+                              dtypes={'FamilyID': 'Int64'}),
+    SycamoreEntity.Definition(name='student_classes', index_col='ID', url='/Student/{entity_id}/Classes?quarter=0&format=1', iterate_over='students', ttl=_HOURS),
+    SycamoreEntity.Definition(name='student_details', index_col=None, url='/Student/{entity_id}', iterate_over='students', ttl=_DAY,
+                              dtypes={'Grade': 'category'},
+                              columns=['FirstName', 'LastName', 'Grade', 'ExtID', 'DOB', 'StateID', 'Email', 'Code']),
+    SycamoreEntity.Definition(name='student_custom_fields', index_col=None, url='/Student/{entity_id}/Statistics', iterate_over='students', ttl=_DAY),
+    SycamoreEntity.Definition(name='contacts', index_col='ID', url='/School/{school_id}/Contacts', ttl=_DAY),
+    SycamoreEntity.Definition(name='classes', index_col='ID', url='/School/{school_id}/Classes?quarter=0', data_location='Period', ttl=_DAY,
+                              dtypes={'TermLength': 'category'}),
+    SycamoreEntity.Definition(name='class_details', index_col=None, url='/School/{school_id}/Classes/{entity_id}', iterate_over='classes', ttl=_DAY),
+    SycamoreEntity.Definition(name='class_students', index_col='ID', url='/Class/{entity_id}/Directory', iterate_over='classes', ttl=_HOURS),
+    SycamoreEntity.Definition(name='employees', index_col='ID', url='/School/{school_id}/Employees', ttl=_DAY,
+                              dtypes={'Active': 'bool', 'Current': 'bool', 'Position': 'category'},
+                              columns=['FirstName', 'LastName', 'Email1', 'Position', 'Active', 'Current', 'ManagerID']),
+    SycamoreEntity.Definition(name='years', index_col='ID', url='/School/{school_id}/Years', ttl=_MONTH,
+                              dtypes={'Current': 'bool'}, columns=['Name', 'Current']),
+    SycamoreEntity.Definition(name='years_details', index_col=None, url='/School/{school_id}/Years/{entity_id}', iterate_over='years', ttl=_MONTH),
+]
+
+# The largest entities, worth memory-mapping when several exporters run on
+# the same host, see Cache(memory_map=...).
+MEMORY_MAP_ENTITIES = ['student_classes', 'class_students', 'family_contacts']
+
+# Records fetch time, row count and URL of every entity in the cache_dir.
+MANIFEST_FILE = 'manifest.json'
+
+# Number of concurrent requests used to fetch "iterate_over" entities.
+DEFAULT_WORKERS = 8
+
+# While loading from remote, progress is checkpointed into this subdirectory
+# of the cache_dir, so that an interrupted load can be resumed.
+CHECKPOINT_DIR = 'checkpoint'
+# Number of "iterate_over" requests between two checkpoints. Each checkpoint
+# only writes the requests completed since the previous one, as a numbered
+# chunk file.
+CHECKPOINT_INTERVAL = 100
+# Checkpoints that haven't been updated for longer are discarded rather than
+# resumed.
+CHECKPOINT_MAX_AGE = datetime.timedelta(days=1)
+
+# The area of the student statistics that holds the school's custom fields.
+CUSTOM_FIELDS_SCOPE = 'Local.General'
+
+def _custom_fields(student_custom_fields: pandas.DataFrame):
+    """The IDs of the students and the first value of each of their custom
+    fields in CUSTOM_FIELDS_SCOPE, one row per student and field name."""
+    student_ids = student_custom_fields.index[~student_custom_fields.index.duplicated()]
+    if CUSTOM_FIELDS_SCOPE not in student_custom_fields.columns:
+        return student_ids, pandas.DataFrame({'student_id': [], 'name': [], 'value': []})
+
+    fields = student_custom_fields.loc[student_ids, CUSTOM_FIELDS_SCOPE].explode().dropna()
+    values = pandas.DataFrame({
+        'student_id': fields.index,
+        'name': [field['Name'] for field in fields],
+        'value': pandas.Series([field['Value'] for field in fields], dtype=object).to_numpy(),
+    })
+    return student_ids, values.drop_duplicates(subset=['student_id', 'name'], keep='first')
+
+def _pivot(values: pandas.DataFrame, column: str, student_ids: pandas.Index, index_name) -> pandas.DataFrame:
+    pivoted = values.pivot(index='student_id', columns='name', values=column).reindex(student_ids)
+    pivoted.columns.name = None
+    pivoted.index.name = index_name
+    return pivoted
+
+def _pivot_custom_fields(student_custom_fields: pandas.DataFrame) -> pandas.DataFrame:
+    """Turns the list of {'Name': ..., 'Value': ...} dicts each student has in
+    CUSTOM_FIELDS_SCOPE into one string column per custom field name. If a
+    name occurs more than once, its first value is used. Fields without a
+    value and fields the student doesn't have are both missing, see
+    _pivot_custom_fields_present() to tell them apart."""
+    student_ids, values = _custom_fields(student_custom_fields)
+    return _pivot(values, 'value', student_ids, student_custom_fields.index.name).astype('string')
+
+def _pivot_custom_fields_present(student_custom_fields: pandas.DataFrame) -> pandas.DataFrame:
+    """Whether each student has each custom field, in the shape of
+    _pivot_custom_fields()."""
+    student_ids, values = _custom_fields(student_custom_fields)
+    present = _pivot(values.assign(present=True), 'present', student_ids, student_custom_fields.index.name)
+    return present.fillna(False).astype(bool)
+
+# Entities computed from other entities. They are saved next to them and built
+# again when the entity they are derived from was fetched.
+DERIVED_ENTITIES = [
+    SycamoreEntity.Derived(name='student_custom_values', source='student_custom_fields', build=_pivot_custom_fields),
+    SycamoreEntity.Derived(name='student_custom_present', source='student_custom_fields',
+                           build=_pivot_custom_fields_present),
 ]
 
 def _get_entity(entity_name: str):
@@ -32,6 +127,80 @@ def _get_entity(entity_name: str):
             return entity
     raise InvalidEntity
 
+def _get_derived(entity_name: str):
+    for derived in DERIVED_ENTITIES:
+        if derived.name == entity_name:
+            return derived
+    return None
+
+def _convert(series: pandas.Series, dtype: str) -> pandas.Series:
+    if dtype == 'bool':
+        # The REST interface returns flags as 0/1, or as '0'/'1'.
+        return pandas.to_numeric(series, errors='coerce').fillna(0) != 0
+    if dtype == 'Int64':
+        return pandas.to_numeric(series, errors='coerce').astype('Int64')
+    return series.astype(dtype)
+
+def _apply_schema(entity: SycamoreEntity.Definition, frame: pandas.DataFrame) -> pandas.DataFrame:
+    """Keeps the columns of an entity, and the ID column of the entity it
+    iterates over, and converts them to their types. Frames that were already
+    converted are returned as they are."""
+    if frame is None:
+        return None
+    if entity.columns is not None:
+        keep = set(entity.columns)
+        if entity.iterate_over is not None:
+            keep.add(entity.iterate_over + '_id')
+        if not keep.issuperset(frame.columns):
+            frame = frame[[column for column in frame.columns if column in keep]]
+    converted = {column: _convert(frame[column], dtype) for column, dtype in entity.dtypes.items()
+                 if column in frame.columns and str(frame[column].dtype) != dtype}
+    return frame.assign(**converted) if converted else frame
+
+def _build_dependency_graph(entities):
+    """Returns the entities without a parent and a map from each entity name
+    to the entities that iterate over it."""
+    names = set(entity.name for entity in entities)
+    roots = []
+    dependents = {entity.name: [] for entity in entities}
+    for entity in entities:
+        if entity.iterate_over is None:
+            roots.append(entity)
+        elif entity.iterate_over in names:
+            dependents[entity.iterate_over].append(entity)
+        else:
+            raise InvalidEntity('entity "{}" iterates over unknown entity "{}"'.format(entity.name, entity.iterate_over))
+    return roots, dependents
+
+def _diff_rows(previous: pandas.DataFrame, current: pandas.DataFrame):
+    """Compares two versions of an entity by index. Returns the lists of
+    added, changed and removed IDs."""
+    previous = previous.loc[~previous.index.duplicated()]
+    current = current.loc[~current.index.duplicated()]
+
+    added = [entity_id for entity_id in current.index if entity_id not in previous.index]
+    removed = [entity_id for entity_id in previous.index if entity_id not in current.index]
+
+    common = current.index[current.index.isin(previous.index)]
+    columns = previous.columns.union(current.columns)
+    # Compare the string representation, so that NaN equals NaN and columns
+    # holding lists or dicts can be compared as well.
+    previous_values = previous.reindex(index=common, columns=columns).astype(str)
+    current_values = current.reindex(index=common, columns=columns).astype(str)
+    differs = (previous_values != current_values).any(axis=1)
+    changed = list(common[differs.to_numpy()])
+
+    return added, changed, removed
+
+def _diff_keyed(entity: SycamoreEntity.Definition, frame: pandas.DataFrame) -> pandas.DataFrame:
+    """The frame indexed by the keys _diff_rows() compares the rows of an
+    entity by. An entity iterating over another one can have the same ID for
+    several parents, e.g. a student in several classes, so its rows are keyed
+    by (parent ID, ID)."""
+    if entity.iterate_over is None:
+        return frame
+    return frame.set_index(pandas.MultiIndex.from_arrays([frame[entity.iterate_over + '_id'], frame.index]))
+
 class InvalidEntity(Exception):
     pass
 
@@ -41,12 +210,51 @@ class InvalidCacheDir(Exception):
 class InvalidRestInterface(Exception):
     pass
 
+class LoadAborted(Exception):
+    pass
+
 class Cache:
-    def __init__(self, rest: SycamoreRest.Extract = None, cache_dir: str = None, reload: bool = False):
+    def __init__(self, rest: SycamoreRest.Extract = None, cache_dir: str = None, reload: bool = False,
+                 workers: int = DEFAULT_WORKERS, resume: bool = False, refresh: bool = False,
+                 expire: bool = True, format: str = SycamoreStorage.DEFAULT_FORMAT, columns: dict = None,
+                 preload: list = None, memory_map: list = None):
+        SycamoreStorage.check_format(format)
         self.rest = rest
+        self.workers = workers
+        self.resume = resume
+        self._checkpoint_dir = None
+        # The number of partial checkpoint chunks written for each entity.
+        self._partial_chunks = {}
+        # Shared by all entities, so that at most "workers" requests are in
+        # flight even when several entities load at the same time.
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        self._abort = threading.Event()
+        # One lock per entity, so that concurrent get() calls load an entity
+        # only once without blocking each other on unrelated entities.
+        self._locks = {entity.name: threading.RLock() for entity in ENTITIES + DERIVED_ENTITIES}
+        self._manifest_lock = threading.Lock()
+        # In lazy mode, entities are loaded from files on first use, and
+        # saved right away when they have to be fetched from remote.
+        self._lazy = False
+        self._expired = set()
 
         self.entities = {}
+        self.timings = {}
+        # Time each entity was fetched from remote by this instance.
+        self.fetched = {}
         self.cache_dir = cache_dir
+        self.format = format
+        # Maps entity names to the columns to load from files, all columns are
+        # loaded for entities that aren't listed.
+        self.columns = columns or {}
+        # Entity names to memory-map when loading from feather files.
+        self.memory_map = set(memory_map or [])
+        # Resident memory of the process before and after loading each entity
+        # from its file.
+        self.load_memory = {}
+        # Per "iterate_over" entity, the frame the index was built for and the
+        # map from parent ID to row positions.
+        self._child_indexes = {}
 
         if self.cache_dir is not None:
             # If the cache_dir is set, but it's pointing to something that's not
@@ -54,22 +262,55 @@ class Cache:
             if os.path.exists(self.cache_dir) and not os.path.isdir(self.cache_dir):
                 raise InvalidCacheDir('cache_dir "{}" is not a directory'.format(self.cache_dir))
 
-            if not reload:
+            if not reload and refresh:
                 try:
-                    self._loadFromFiles()
+                    # A refresh merges new data into the cached frames, so
+                    # they have to be complete.
+                    self._loadFromFiles(projection=False)
+                    self._refreshFromRemote()
+                    self._saveToFiles()
                     # No need to contine, we're done initializing.
                     return
                 except Exception as ex:
-                    print('Could not load from files ({}), loading from remote."'.format(ex))
+                    print('Could not refresh from files ({}), loading from remote."'.format(ex))
+                    self.entities = {}
                     # Fall through to loading from remote.
+            elif not reload and (self._hasFiles() or not self.rest):
+                # Without a REST interface, the files there are can only be
+                # loaded as they are.
+                self._lazy = True
+                if expire and self.rest:
+                    self._expired = set(self._expiredEntities())
+                    if self._expired:
+                        print('Expired entities {}'.format(', '.join(sorted(self._expired))))
+                for entity_name in preload or []:
+                    self.get(entity_name)
+                return
 
         self._loadFromRemote()
 
         if self.cache_dir is not None:
             self._saveToFiles()
+            self._removeCheckpoint()
+
+    def _entityPath(self, entity_name: str) -> str:
+        return SycamoreStorage.path(self.cache_dir, entity_name, self.format)
 
+    def _loadEntityFile(self, entity: SycamoreEntity.Definition, projection: bool) -> pandas.DataFrame:
+        path = self._entityPath(entity.name)
+        legacy_path = SycamoreStorage.path(self.cache_dir, entity.name, 'pickle')
+        if not os.path.exists(path) and self.format != 'pickle' and os.path.exists(legacy_path):
+            # Convert caches that were written as pickles, keeping their
+            # modification time for the TTL check.
+            SycamoreStorage.save(SycamoreStorage.load(legacy_path, 'pickle'), path, self.format)
+            legacy_stat = os.stat(legacy_path)
+            os.utime(path, (legacy_stat.st_atime, legacy_stat.st_mtime))
 
-    def _loadFromFiles(self):
+        columns = self.columns.get(entity.name) if projection else None
+        return SycamoreStorage.load(path, self.format, columns=columns,
+                                    memory_map=entity.name in self.memory_map)
+
+    def _loadFromFiles(self, projection: bool = True):
         if self.cache_dir is None:
             raise InvalidCacheDir('cache_dir not set')
 
@@ -81,20 +322,294 @@ class Cache:
 
         try:
             for entity in ENTITIES:
-                self.entities[entity.name] = pandas.read_pickle(
-                    os.path.join(self.cache_dir, '{name}.pkl'.format(name=entity.name)))
+                self.entities[entity.name] = _apply_schema(entity, self._loadEntityFile(entity, projection))
         except:
             # If anything goes wrong, clear the cache
             self.entities = {}
             raise
 
+    def _readManifest(self) -> dict:
+        path = os.path.join(self.cache_dir, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return {}
+        with open(path, 'r') as manifest_file:
+            return json.load(manifest_file)
+
+    def _writeManifest(self):
+        with self._manifest_lock:
+            manifest = self._readManifest()
+            for entity in ENTITIES:
+                if entity.name not in self.fetched:
+                    continue
+                manifest[entity.name] = {
+                    'fetched': self.fetched[entity.name].isoformat(),
+                    'rows': len(self.entities[entity.name].index),
+                    'url': entity.url,
+                }
+
+            path = os.path.join(self.cache_dir, MANIFEST_FILE)
+            with open(path + '.tmp', 'w') as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            os.replace(path + '.tmp', path)
+
+    def _fileTime(self, entity: SycamoreEntity.Definition) -> datetime.datetime:
+        for path in (self._entityPath(entity.name), SycamoreStorage.path(self.cache_dir, entity.name, 'pickle')):
+            if os.path.exists(path):
+                return datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        return None
+
+    def _hasFiles(self) -> bool:
+        # An empty or incomplete cache is loaded from remote in one go, which
+        # schedules the requests and can resume from a checkpoint.
+        return all(self._fileTime(entity) is not None for entity in ENTITIES)
+
+    def _expiredEntities(self) -> list:
+        # An entity is expired if its TTL has passed or if the entity it
+        # iterates over is expired, since the set of IDs may have changed.
+        manifest = self._readManifest()
+        now = datetime.datetime.now()
+        expired = []
+        for entity in ENTITIES:
+            if entity.iterate_over in expired:
+                expired.append(entity.name)
+                continue
+            if entity.ttl is None:
+                continue
+
+            if entity.name in manifest:
+                fetched = datetime.datetime.fromisoformat(manifest[entity.name]['fetched'])
+            else:
+                # Caches written before there was a manifest.
+                fetched = self._fileTime(entity)
+            if fetched is None or now - fetched > entity.ttl:
+                expired.append(entity.name)
+        return expired
+
+    def _loadFromFile(self, entity: SycamoreEntity.Definition) -> bool:
+        # Returns whether the entity could be loaded from its file.
+        if not self._lazy or entity.name in self._expired:
+            return False
+        try:
+            before = SycamoreStorage.resident_memory()
+            self.entities[entity.name] = _apply_schema(entity, self._loadEntityFile(entity, projection=True))
+            self.load_memory[entity.name] = (before, SycamoreStorage.resident_memory())
+            return True
+        except Exception as ex:
+            if not self.rest:
+                raise
+            print('Could not load entity.name={} from files ({}), loading from remote.'.format(entity.name, ex))
+            return False
+
+    def _saveEntity(self, entity: SycamoreEntity.Definition):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        SycamoreStorage.save(self.entities[entity.name], self._entityPath(entity.name), self.format)
+        self._writeManifest()
+
+    def _isAsync(self) -> bool:
+        return isinstance(self.rest, SycamoreRest.AsyncExtract)
+
     def _loadFromRemote(self):
         if not self.rest:
             raise InvalidRestInterface('REST interface not set')
 
+        self._startCheckpoint()
+        start = time.monotonic()
+        if self._isAsync():
+            asyncio.run(self._loadFromRemoteAsync())
+        else:
+            self._loadFromRemoteScheduled()
+        self._printTimings(time.monotonic() - start)
+
+    def _refreshFromRemote(self):
+        # Re-request the top-level entities, which are one request each, and
+        # only request the entities iterating over them for IDs that were
+        # added or changed.
+        if not self.rest:
+            raise InvalidRestInterface('REST interface not set')
+
+        roots, dependents = _build_dependency_graph(ENTITIES)
+        manifest = self._readManifest()
+
+        def refreshTree(entity: SycamoreEntity.Definition, previous: pandas.DataFrame):
+            added, changed, removed = _diff_rows(_diff_keyed(entity, previous),
+                                                 _diff_keyed(entity, self.entities[entity.name]))
+            print('Refreshed entity={} added={} changed={} removed={}'.format(
+                entity.name, len(added), len(changed), len(removed)))
+            # The entities iterating over this one are requested again for
+            # the IDs of the added and changed rows.
+            stale_ids = {key[1] if entity.iterate_over else key for key in added + changed}
+            for dependent in dependents[entity.name]:
+                previous_dependent = self.entities[dependent.name]
+                self.entities[dependent.name] = _apply_schema(dependent, self._refreshChildren(
+                    dependent, self.entities[entity.name].index, stale_ids))
+                if self.entities[entity.name].index.isin(stale_ids).all():
+                    self.fetched[dependent.name] = datetime.datetime.now()
+                else:
+                    # The rows of unchanged IDs are as old as the previous
+                    # fetch, so the TTL still expires them.
+                    self.fetched[dependent.name] = self._previousFetched(dependent, manifest)
+                refreshTree(dependent, previous_dependent)
+
+        for entity in roots:
+            previous = self.entities[entity.name]
+            if self._isAsync():
+                self.entities[entity.name] = _apply_schema(entity, asyncio.run(self.rest.get(entity)))
+            else:
+                self.entities[entity.name] = _apply_schema(entity, self.rest.get(entity))
+            self.fetched[entity.name] = datetime.datetime.now()
+            refreshTree(entity, previous)
+
+    def _previousFetched(self, entity: SycamoreEntity.Definition, manifest: dict) -> datetime.datetime:
+        if entity.name in manifest:
+            return datetime.datetime.fromisoformat(manifest[entity.name]['fetched'])
+        # Caches written before there was a manifest.
+        return self._fileTime(entity) or datetime.datetime.now()
+
+    def _refreshChildren(self, entity: SycamoreEntity.Definition, entity_ids, stale_ids) -> pandas.DataFrame:
+        parent_column = entity.iterate_over + '_id'
+        current = self.entities[entity.name]
+        stale_ids = set(stale_ids)
+
+        # Drop rows of removed and changed IDs, the latter are requested again.
+        frames = [current.loc[current[parent_column].isin(entity_ids) & ~current[parent_column].isin(stale_ids)]]
+        to_fetch = [entity_id for entity_id in entity_ids if entity_id in stale_ids]
+        if to_fetch:
+            if self._isAsync():
+                frames.append(asyncio.run(self._fetchChildrenAsync(entity, to_fetch)))
+            else:
+                frames.append(self._fetchChildren(entity, to_fetch))
+        frame = pandas.concat(frames)
+
+        # Restore the order of a full load, which follows entity_ids.
+        positions = {}
+        for position, entity_id in enumerate(entity_ids):
+            positions.setdefault(entity_id, position)
+        order = frame[parent_column].map(positions).to_numpy()
+        return frame.iloc[numpy.argsort(order, kind='stable')]
+
+    def _startCheckpoint(self):
+        if self.cache_dir is None:
+            return
+
+        self._checkpoint_dir = os.path.join(self.cache_dir, CHECKPOINT_DIR)
+        if os.path.isdir(self._checkpoint_dir):
+            updated = datetime.datetime.fromtimestamp(os.path.getmtime(self._checkpoint_dir))
+            if not self.resume or datetime.datetime.now() - updated > CHECKPOINT_MAX_AGE:
+                shutil.rmtree(self._checkpoint_dir, ignore_errors=True)
+            else:
+                print('Resuming from checkpoint last updated at {}'.format(updated))
+
+        os.makedirs(self._checkpoint_dir, exist_ok=True)
+
+        # Entities that were completely loaded don't need to be loaded again.
         for entity in ENTITIES:
+            path = os.path.join(self._checkpoint_dir, '{name}.pkl'.format(name=entity.name))
+            if os.path.exists(path):
+                self.entities[entity.name] = pandas.read_pickle(path)
+                self.fetched[entity.name] = datetime.datetime.fromtimestamp(os.path.getmtime(path))
+
+    def _removeCheckpoint(self):
+        if self.cache_dir is not None:
+            shutil.rmtree(os.path.join(self.cache_dir, CHECKPOINT_DIR), ignore_errors=True)
+        self._checkpoint_dir = None
+
+    def _writeCheckpointFile(self, name: str, data):
+        # Write to a temporary file first, so an interruption can't leave a
+        # truncated checkpoint behind.
+        path = os.path.join(self._checkpoint_dir, name)
+        pandas.to_pickle(data, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def _partialPaths(self, entity: SycamoreEntity.Definition) -> list:
+        prefix = '{name}.partial.'.format(name=entity.name)
+        return [os.path.join(self._checkpoint_dir, name) for name in sorted(os.listdir(self._checkpoint_dir))
+                if name.startswith(prefix) and name.endswith('.pkl')]
+
+    def _checkpointEntity(self, entity: SycamoreEntity.Definition):
+        if self._checkpoint_dir is None:
+            return
+        self._writeCheckpointFile('{name}.pkl'.format(name=entity.name), self.entities[entity.name])
+        for path in self._partialPaths(entity):
+            os.remove(path)
+        self._partial_chunks.pop(entity.name, None)
+
+    def _checkpointPartial(self, entity: SycamoreEntity.Definition, pending: dict):
+        # "pending" maps the IDs of the "iterate_over" entity that were done
+        # since the last checkpoint to the data retrieved for them (None if
+        # there was none). It is written as the next chunk and cleared.
+        if self._checkpoint_dir is None or not pending:
+            pending.clear()
+            return
+        chunk = self._partial_chunks.get(entity.name, 0)
+        self._writeCheckpointFile('{name}.partial.{chunk:06d}.pkl'.format(name=entity.name, chunk=chunk), dict(pending))
+        self._partial_chunks[entity.name] = chunk + 1
+        pending.clear()
+
+    def _loadPartial(self, entity: SycamoreEntity.Definition) -> dict:
+        if self._checkpoint_dir is None:
+            return {}
+        paths = self._partialPaths(entity)
+        self._partial_chunks[entity.name] = len(paths)
+        if not paths:
+            return {}
+        fetched = {}
+        for path in paths:
+            fetched.update(pandas.read_pickle(path))
+        print('Resuming entity={} with {} entity_ids done'.format(entity.name, len(fetched)))
+        return fetched
+
+    def _loadFromRemoteScheduled(self):
+        # Every entity is started as soon as the entity it iterates over is
+        # loaded, so independent subtrees load in parallel.
+        roots, dependents = _build_dependency_graph(ENTITIES)
+        self._abort.clear()
+        scheduler = concurrent.futures.ThreadPoolExecutor(max_workers=len(ENTITIES))
+        try:
+            pending = {scheduler.submit(self._timedGet, entity): entity for entity in roots}
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    entity = pending.pop(future)
+                    future.result()
+                    for dependent in dependents[entity.name]:
+                        pending[scheduler.submit(self._timedGet, dependent)] = dependent
+        except:
+            # Stop the other entities, they can't be saved anyway.
+            self._abort.set()
+            raise
+        finally:
+            scheduler.shutdown(wait=True, cancel_futures=True)
+
+    def _timedGet(self, entity: SycamoreEntity.Definition):
+        print('Loading {}'.format(entity))
+        start = time.monotonic()
+        self.get(entity.name)
+        self.timings[entity.name] = time.monotonic() - start
+
+    async def _loadFromRemoteAsync(self):
+        # Every top-level entity is loaded at the same time, followed by the
+        # entities that iterate over it.
+        roots, dependents = _build_dependency_graph(ENTITIES)
+
+        async def loadTree(entity: SycamoreEntity.Definition):
             print('Loading {}'.format(entity))
-            _ = self.get(entity.name)
+            start = time.monotonic()
+            await self._getAsync(entity.name)
+            self.timings[entity.name] = time.monotonic() - start
+            await asyncio.gather(*[loadTree(dependent) for dependent in dependents[entity.name]])
+
+        await asyncio.gather(*[loadTree(entity) for entity in roots])
+
+    def _printTimings(self, total: float):
+        print('Load times:')
+        for entity in ENTITIES:
+            if entity.name not in self.timings:
+                continue
+            print('   entity={} seconds={:.1f} rows={}'.format(
+                entity.name, self.timings[entity.name], len(self.entities[entity.name].index)))
+        print('   total seconds={:.1f}'.format(total))
+        if hasattr(self.rest, 'counters'):
+            print('   requests {}'.format(' '.join('{}={}'.format(k, v) for k, v in self.rest.counters().items())))
 
     def _saveToFiles(self):
         # If target directory doesn't exist, create it.
@@ -103,41 +618,230 @@ class Cache:
         elif not os.path.isdir(self.cache_dir):
             raise InvalidCacheDir('cache_dir "{}" is not a directory'.format(self.cache_dir))
 
+        # Entities that were loaded from files are unchanged.
+        for entity in ENTITIES:
+            if entity.name not in self.entities or entity.name not in self.fetched:
+                continue
+            SycamoreStorage.save(self.entities[entity.name], self._entityPath(entity.name), self.format)
+
+        for derived in DERIVED_ENTITIES:
+            if derived.source in self.fetched:
+                self._buildDerived(derived)
+
+        self._writeManifest()
+
+    def _buildDerived(self, derived: SycamoreEntity.Derived):
+        self.entities[derived.name] = derived.build(self.get(derived.source))
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            SycamoreStorage.save(self.entities[derived.name], self._entityPath(derived.name), self.format)
+
+    def _getDerived(self, derived: SycamoreEntity.Derived) -> pandas.DataFrame:
+        # Makes sure the source is loaded, and fetched first if it expired.
+        self.get(derived.source)
+        with self._locks[derived.name]:
+            if derived.name in self.entities:
+                return self.entities[derived.name]
+
+            # The file is only valid if it was written after the file of the
+            # entity it is derived from.
+            derived_time = self._fileTime(derived) if self.cache_dir is not None else None
+            source_time = self._fileTime(_get_entity(derived.source)) if self.cache_dir is not None else None
+            if (self._lazy and derived_time is not None and source_time is not None
+                    and derived_time >= source_time):
+                self.entities[derived.name] = self._loadEntityFile(derived, projection=True)
+            else:
+                self._buildDerived(derived)
+            return self.entities[derived.name]
+
+    def memoryReport(self) -> pandas.DataFrame:
+        """Returns the memory used by each loaded entity: the size of the frame
+        and the change in resident memory of the process while loading it from
+        its file. Memory-mapped columns count towards the frame size, but only
+        their pages that are touched count towards resident memory."""
+        rows = []
         for entity in ENTITIES:
             if entity.name not in self.entities:
                 continue
-            self.entities[entity.name].to_pickle(
-                os.path.join(self.cache_dir, '{name}.pkl'.format(name=entity.name)))
+            before, after = self.load_memory.get(entity.name, (None, None))
+            rows.append({
+                'entity': entity.name,
+                'rows': len(self.entities[entity.name].index),
+                'frame_bytes': int(self.entities[entity.name].memory_usage(deep=True).sum()),
+                'resident_before': before,
+                'resident_after': after,
+                'resident_delta': after - before if before is not None and after is not None else None,
+                'memory_mapped': entity.name in self.memory_map and self.format == 'feather',
+            })
+        return pandas.DataFrame(rows).set_index('entity')
+
+    def printMemoryReport(self):
+        print('Memory use:')
+        for entity, row in self.memoryReport().iterrows():
+            print('   entity={} rows={} frame_bytes={} resident_delta={} memory_mapped={}'.format(
+                entity, row['rows'], row['frame_bytes'], row['resident_delta'], row['memory_mapped']))
 
     def compare(self, other: 'Cache'):
         for entity in ENTITIES:
             print(self.get(entity.name).compare(other.get(entity.name)))
 
     def get(self, entity_name: str):
+        derived = _get_derived(entity_name)
+        if derived is not None:
+            return self._getDerived(derived)
+
         entity = _get_entity(entity_name)
-        if entity.name not in self.entities:
+        with self._locks[entity.name]:
+            if entity.name not in self.entities and not self._loadFromFile(entity):
+                if self._isAsync():
+                    asyncio.run(self._getAsync(entity.name))
+                else:
+                    self._fetch(entity)
+
+        return self.entities[entity.name]
+
+    def children(self, entity_name: str, parent_id) -> pandas.DataFrame:
+        """Returns the rows of an "iterate_over" entity that belong to the given
+        ID of the entity it iterates over, e.g. children('student_classes',
+        student_id). Equivalent to filtering on the "[iterate_over]_id" column,
+        but uses an index that is built once per entity."""
+        frame, positions = self._childPositions(entity_name)
+        if parent_id not in positions:
+            return frame.iloc[0:0]
+        return frame.iloc[positions[parent_id]]
+
+    def childrenOf(self, entity_name: str, parent_ids) -> pandas.DataFrame:
+        """children() for several IDs at once, ordered by the position of
+        their parent ID in parent_ids. The order of the rows of one parent is
+        kept."""
+        frame, positions = self._childPositions(entity_name)
+        parts = [positions[parent_id] for parent_id in parent_ids if parent_id in positions]
+        return frame.iloc[numpy.concatenate(parts) if parts else []]
+
+    def _childPositions(self, entity_name: str) -> tuple:
+        entity = _get_entity(entity_name)
+        if entity.iterate_over is None:
+            raise InvalidEntity('entity "{}" does not iterate over another entity'.format(entity.name))
+
+        frame = self.get(entity.name)
+        with self._locks[entity.name]:
+            indexed_frame, positions = self._child_indexes.get(entity.name, (None, None))
+            if indexed_frame is not frame:
+                positions = frame.groupby(entity.iterate_over + '_id', sort=False).indices
+                self._child_indexes[entity.name] = (frame, positions)
+        return frame, positions
+
+    def _fetch(self, entity: SycamoreEntity.Definition):
+        if not self.rest:
+            raise InvalidRestInterface('REST interface not set')
+
+        if entity.iterate_over is None:
+            self.entities[entity.name] = self.rest.get(entity)
+        else:
+            entity_iterate_over = self.get(entity.iterate_over)
+            self.entities[entity.name] = self._fetchChildren(entity, entity_iterate_over.index)
+        self._markFetched(entity)
+
+    def _markFetched(self, entity: SycamoreEntity.Definition):
+        self.entities[entity.name] = _apply_schema(entity, self.entities[entity.name])
+        self.fetched[entity.name] = datetime.datetime.now()
+        self._checkpointEntity(entity)
+        if self._lazy:
+            self._saveEntity(entity)
+        # Entities derived from this one are built again on their next get().
+        for derived in DERIVED_ENTITIES:
+            if derived.source == entity.name:
+                self.entities.pop(derived.name, None)
+
+    def _fetchChildren(self, entity: SycamoreEntity.Definition, entity_ids) -> pandas.DataFrame:
+        # Requests are issued concurrently, but results are collected in the
+        # order of entity_ids so that the resulting frame has the same row order
+        # as a sequential load.
+        fetched = self._loadPartial(entity)
+        pending = {}
+        remaining = [entity_id for entity_id in entity_ids if entity_id not in fetched]
+        total = len(entity_ids)
+        futures = [self._executor.submit(self.rest.get, entity, entity_id=entity_id) for entity_id in remaining]
+        try:
+            for count, (entity_id, future) in enumerate(zip(remaining, futures), start=len(fetched) + 1):
+                if self._abort.is_set():
+                    raise LoadAborted('loading entity.name={} was aborted'.format(entity.name))
+                try:
+                    fetched[entity_id] = pending[entity_id] = future.result()
+                except KeyboardInterrupt:
+                    raise
+                except:
+                    print('Failed to load entity.name={} entity_id={}'.format(entity.name, entity_id))
+                    raise
+
+                print('   entity={} percent={} entity_id={}'.format(entity.name, round(count * 100 / total), entity_id))
+                if count % CHECKPOINT_INTERVAL == 0:
+                    self._checkpointPartial(entity, pending)
+        except:
+            # Keep everything that completed, including requests after the
+            # one that failed.
+            for entity_id, future in zip(remaining, futures):
+                if (entity_id not in fetched and future.done() and not future.cancelled()
+                        and future.exception() is None):
+                    fetched[entity_id] = pending[entity_id] = future.result()
+            self._checkpointPartial(entity, pending)
+            raise
+        finally:
+            # Don't keep fetching the remaining entities if one of them failed.
+            for future in futures:
+                future.cancel()
+
+        return self._concatChildren(entity, entity_ids, fetched)
+
+    async def _getAsync(self, entity_name: str):
+        entity = _get_entity(entity_name)
+        if entity.name not in self.entities and not self._loadFromFile(entity):
             if entity.iterate_over is None:
-                self.entities[entity.name] = self.rest.get(entity)
+                self.entities[entity.name] = await self.rest.get(entity)
             else:
-                all_data = []
-                entity_iterate_over = self.get(entity.iterate_over)
-                total = len(entity_iterate_over.index)
-                count = 0
-                for entity_id, _ in entity_iterate_over.iterrows():
-                    count = count + 1
-                    try:
-                        print('   entity={} percent={} entity_id={}'.format(entity.name, round(count * 100 / total), entity_id))
-                        data = self.rest.get(entity, entity_id=entity_id)
-                        if data is not None:
-                            # Add the "[iterate_over]" entity_id as additional column for lookups
-                            data.insert(loc=0, column=(entity.iterate_over + "_id"), value=entity_id)
-                            all_data.append(data)
-                    except KeyboardInterrupt:
-                        raise
-                    except:
-                        print('Failed to load entity.name={} entity_id={}'.format(entity.name, entity_id))
-                        raise
-
-                self.entities[entity.name] = pandas.concat(all_data)
+                entity_iterate_over = await self._getAsync(entity.iterate_over)
+                self.entities[entity.name] = await self._fetchChildrenAsync(entity, entity_iterate_over.index)
+            self._markFetched(entity)
 
         return self.entities[entity.name]
+
+    async def _fetchChildrenAsync(self, entity: SycamoreEntity.Definition, entity_ids) -> pandas.DataFrame:
+        fetched = self._loadPartial(entity)
+        pending = {}
+        remaining = [entity_id for entity_id in entity_ids if entity_id not in fetched]
+        total = len(entity_ids)
+        count = len(fetched)
+
+        async def fetch(entity_id):
+            nonlocal count
+            try:
+                fetched[entity_id] = pending[entity_id] = await self.rest.get(entity, entity_id=entity_id)
+            except:
+                print('Failed to load entity.name={} entity_id={}'.format(entity.name, entity_id))
+                raise
+            count = count + 1
+            print('   entity={} percent={} entity_id={}'.format(entity.name, round(count * 100 / total), entity_id))
+            if count % CHECKPOINT_INTERVAL == 0:
+                self._checkpointPartial(entity, pending)
+
+        try:
+            await asyncio.gather(*[fetch(entity_id) for entity_id in remaining])
+        except:
+            self._checkpointPartial(entity, pending)
+            raise
+
+        return self._concatChildren(entity, entity_ids, fetched)
+
+    def _concatChildren(self, entity: SycamoreEntity.Definition, entity_ids, fetched: dict) -> pandas.DataFrame:
+        # Concatenate in the order of entity_ids, regardless of the order in
+        # which the requests completed.
+        frames = [self._addParentId(entity, entity_id, fetched[entity_id])
+                  for entity_id in entity_ids if fetched[entity_id] is not None]
+        if not frames:
+            return pandas.DataFrame(columns=[entity.iterate_over + '_id'])
+        return pandas.concat(frames)
+
+    def _addParentId(self, entity: SycamoreEntity.Definition, entity_id, data: pandas.DataFrame) -> pandas.DataFrame:
+        # Add the "[iterate_over]" entity_id as additional column for lookups
+        data.insert(loc=0, column=(entity.iterate_over + "_id"), value=entity_id)
+        return data
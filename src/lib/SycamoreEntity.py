@@ -1,16 +1,40 @@
+from datetime import timedelta
+
 class Definition:
-    def __init__(self, name: str, index_col: str, url: str, iterate_over: str = None, data_location: str = None):
+    def __init__(self, name: str, index_col: str, url: str, iterate_over: str = None, data_location: str = None,
+                 ttl: timedelta = None, dtypes: dict = None, columns: list = None):
         self.name = name
         self.index_col = index_col
         self.url = url
         self.iterate_over = iterate_over
         self.data_location = data_location
+        # How long cached data stays valid, None if it never expires.
+        self.ttl = ttl
+        # Maps columns to their type: 'bool' for flags, 'Int64' for IDs that
+        # may be missing, 'category' for columns with few distinct values.
+        self.dtypes = dtypes or {}
+        # The columns to keep, all columns are kept if None. Nested fields are
+        # named like json_normalize() names them, e.g. 'Facility.Name', and
+        # are dropped before the JSON data is normalized.
+        self.columns = columns
 
     def __str__(self) -> str:
-        return 'name={name}, index_col={index_col}, url={url}, iterate_over={iterate_over}, data_location={data_location}'.format(
+        return 'name={name}, index_col={index_col}, url={url}, iterate_over={iterate_over}, data_location={data_location}, ttl={ttl}'.format(
                 name=self.name,
                 index_col=self.index_col,
                 url=self.url,
                 iterate_over=self.iterate_over,
-                data_location=self.data_location
+                data_location=self.data_location,
+                ttl=self.ttl
             )
+
+class Derived:
+    """An entity that isn't requested from the REST interface, but computed
+    from another entity by build(frame) whenever that entity changes."""
+    def __init__(self, name: str, source: str, build):
+        self.name = name
+        self.source = source
+        self.build = build
+
+    def __str__(self) -> str:
+        return 'name={name}, source={source}'.format(name=self.name, source=self.source)
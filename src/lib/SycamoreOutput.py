@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import concurrent.futures
+import json
+import os
+import pandas
+import time
+
+##
+
+# Number of output files generated at the same time. The generators only read
+# from the cache, so they can share it.
+DEFAULT_WORKERS = 4
+
+# Number of parent records (e.g. students or families) per batch of a
+# streamed output.
+BATCH_SIZE = 500
+
+# In delta mode, the fingerprint of every output file is kept in this
+# subdirectory of the output directory, and the added, changed and removed
+# rows are written to the other.
+FINGERPRINT_DIR = 'fingerprints'
+DELTA_DIR = 'delta'
+DELTA_SUMMARY_FILE = 'summary.csv'
+
+class Output:
+    """One output file: generate() returns the frame to write, which is
+    written with to_csv(**csv_args).
+
+    key names the columns that identify a row, for telling changed rows from
+    added ones in delta mode. It defaults to the first column."""
+    def __init__(self, file_name: str, generate, key: list = None, **csv_args):
+        self.file_name = file_name
+        self.generate = generate
+        self.key = key
+        self.csv_args = dict(index=False, **csv_args)
+
+    def _batches(self):
+        yield self.generate()
+
+    def run(self, output_dir: str, delta: bool = False) -> dict:
+        generate_seconds = 0.0
+        write_seconds = 0.0
+        writer = _Writer(self, output_dir, delta)
+        try:
+            batches = iter(self._batches())
+            while True:
+                start = time.monotonic()
+                frame = next(batches, None)
+                generated = time.monotonic()
+                generate_seconds += generated - start
+                if frame is None:
+                    break
+
+                writer.write(frame)
+                write_seconds += time.monotonic() - generated
+        except:
+            writer.discard()
+            raise
+
+        start = time.monotonic()
+        result = writer.close()
+        result['generate_seconds'] = generate_seconds
+        result['write_seconds'] = write_seconds + time.monotonic() - start
+        return result
+
+class StreamingOutput(Output):
+    """An output file that is written batch by batch, so only one batch is in
+    memory at a time. batches() yields frames with the same columns. The file
+    is the same as the one to_csv writes for collect(batches()).
+
+    Rows are written as they are, so batches() must not yield a row that is
+    already in an earlier batch."""
+    def __init__(self, file_name: str, batches, key: list = None, **csv_args):
+        super().__init__(file_name, lambda: collect(batches()), key=key, **csv_args)
+        self.batches = batches
+
+    def _batches(self):
+        return self.batches()
+
+class _Writer:
+    """Writes the batches of one output to a temporary file, which replaces
+    the output file on close().
+
+    In delta mode, the key and hash of every row are compared with the
+    fingerprint of the previous run. Added and changed rows are written to
+    delta files, and the output file is left alone if nothing changed."""
+    def __init__(self, output: Output, output_dir: str, delta: bool):
+        self.output = output
+        self.path = os.path.join(output_dir, output.file_name)
+        self.delta = delta
+        self.rows = 0
+        self.key = output.key
+        self.files = {'': self._open(self.path)}
+
+        if delta:
+            self.fingerprint_path = os.path.join(output_dir, FINGERPRINT_DIR, output.file_name + '.json')
+            self.delta_dir = os.path.join(output_dir, DELTA_DIR)
+            self.previous = _readFingerprint(self.fingerprint_path)
+            self.current = {}
+            self.counts = {'added': 0, 'changed': 0}
+            for kind in self.counts:
+                self.files[kind] = self._open(self._deltaPath(kind))
+
+    def _open(self, path: str):
+        # Open the file like to_csv does for a path.
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path + '.tmp', 'w', encoding='utf-8', newline='')
+
+    def _deltaPath(self, kind: str) -> str:
+        name, extension = os.path.splitext(self.output.file_name)
+        return os.path.join(self.delta_dir, '{}.{}{}'.format(name, kind, extension))
+
+    def _writeFrame(self, kind: str, frame: pandas.DataFrame):
+        csv_file = self.files[kind]
+        frame.to_csv(csv_file, header=csv_file.tell() == 0, **self.output.csv_args)
+
+    def write(self, frame: pandas.DataFrame):
+        self._writeFrame('', frame)
+        self.rows += len(frame.index)
+        if not self.delta:
+            return
+
+        if self.key is None:
+            self.key = [frame.columns[0]]
+        keys, hashes = _fingerprint(frame, self.key)
+        added = []
+        changed = []
+        for key, row_hash in zip(keys, hashes):
+            # Rows with the same key are told apart by their occurrence.
+            occurrence = key
+            count = 1
+            while occurrence in self.current:
+                count += 1
+                occurrence = '{}#{}'.format(key, count)
+            self.current[occurrence] = row_hash
+            added.append(self.previous is None or occurrence not in self.previous)
+            changed.append(not added[-1] and self.previous[occurrence] != row_hash)
+        for kind, mask in (('added', added), ('changed', changed)):
+            self.counts[kind] += sum(mask)
+            self._writeFrame(kind, frame.loc[mask])
+
+    def discard(self):
+        for csv_file in self.files.values():
+            csv_file.close()
+            if os.path.exists(csv_file.name):
+                os.remove(csv_file.name)
+
+    def close(self) -> dict:
+        for csv_file in self.files.values():
+            csv_file.close()
+        if not self.delta:
+            os.replace(self.path + '.tmp', self.path)
+            return {'rows': self.rows}
+
+        removed = [] if self.previous is None else [key for key in self.previous if key not in self.current]
+        result = dict(rows=self.rows, removed=len(removed), **self.counts)
+        result['unchanged'] = (self.previous is not None and os.path.exists(self.path)
+                               and not removed and not any(self.counts.values()))
+        if result['unchanged']:
+            # Keep the previous file, and don't leave the deltas of an earlier
+            # run behind.
+            self.discard()
+            for kind in ('added', 'changed', 'removed'):
+                if os.path.exists(self._deltaPath(kind)):
+                    os.remove(self._deltaPath(kind))
+            return result
+
+        # Write the removed rows and the fingerprint to temporary files as
+        # well before replacing anything, so a failure can't leave the output
+        # and the fingerprint out of sync.
+        kinds = list(self.counts) + ['removed']
+        try:
+            # Removed rows are only known by their key.
+            pandas.DataFrame([_keyValues(key) for key in removed], columns=self.key).to_csv(
+                self._deltaPath('removed') + '.tmp', index=False)
+            os.makedirs(os.path.dirname(self.fingerprint_path), exist_ok=True)
+            _writeFingerprint(self.fingerprint_path + '.tmp', self.key, self.current)
+        except:
+            for path in [self.path] + [self._deltaPath(kind) for kind in kinds] + [self.fingerprint_path]:
+                if os.path.exists(path + '.tmp'):
+                    os.remove(path + '.tmp')
+            raise
+
+        os.replace(self.path + '.tmp', self.path)
+        for kind in kinds:
+            os.replace(self._deltaPath(kind) + '.tmp', self._deltaPath(kind))
+        os.replace(self.fingerprint_path + '.tmp', self.fingerprint_path)
+        return result
+
+def _fingerprint(frame: pandas.DataFrame, key: list):
+    """Returns the key of every row, as a JSON list of its key values, and a
+    hash of all of the row's values."""
+    values = frame.astype(str)
+    keys = [json.dumps(list(row)) for row in values[key].itertuples(index=False, name=None)]
+    hashes = ['{:016x}'.format(row_hash) for row_hash in pandas.util.hash_pandas_object(values, index=False)]
+    return keys, hashes
+
+def _keyValues(key: str) -> list:
+    # Strip the occurrence of a repeated key, see _Writer.write().
+    if not key.endswith(']'):
+        key = key.rsplit('#', 1)[0]
+    return json.loads(key)
+
+def _readFingerprint(path: str) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as fingerprint_file:
+        return json.load(fingerprint_file)['rows']
+
+def _writeFingerprint(path: str, key: list, rows: dict):
+    with open(path, 'w') as fingerprint_file:
+        json.dump({'key': key, 'rows': rows}, fingerprint_file)
+
+def collect(batches) -> pandas.DataFrame:
+    """Concatenates the frames yielded by a batches() function of a
+    StreamingOutput."""
+    return pandas.concat(list(batches))
+
+def generate_all(outputs: list, output_dir: str, workers: int = DEFAULT_WORKERS, delta: bool = False) -> dict:
+    """Generates and writes the outputs concurrently, so files are written
+    while others are still being generated. Returns the timings per file
+    name, and prints them in the order of outputs.
+
+    In delta mode, the rows added, changed and removed since the previous
+    delta run are written to DELTA_DIR, together with a summary. Files
+    without changes aren't written at all."""
+    start = time.monotonic()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = {output.file_name: executor.submit(output.run, output_dir, delta) for output in outputs}
+        timings = {}
+        for output in outputs:
+            try:
+                timings[output.file_name] = futures[output.file_name].result()
+            except:
+                print('Failed to generate file={}'.format(output.file_name))
+                raise
+    finally:
+        # Don't start the remaining files if one of them failed.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    print('Output times:')
+    for file_name, timing in timings.items():
+        print('   file={} rows={} generate_seconds={:.1f} write_seconds={:.1f}'.format(
+            file_name, timing['rows'], timing['generate_seconds'], timing['write_seconds']))
+    print('   total seconds={:.1f}'.format(time.monotonic() - start))
+
+    if delta:
+        _writeDeltaSummary(timings, output_dir)
+    return timings
+
+def _writeDeltaSummary(timings: dict, output_dir: str):
+    summary = pandas.DataFrame([
+        {'file': file_name, 'rows': timing['rows'], 'added': timing['added'], 'changed': timing['changed'],
+         'removed': timing['removed'], 'unchanged': timing['unchanged']}
+        for file_name, timing in timings.items()])
+    print('Delta:')
+    for row in summary.itertuples(index=False):
+        print('   file={} added={} changed={} removed={}{}'.format(
+            row.file, row.added, row.changed, row.removed, ' unchanged' if row.unchanged else ''))
+    if summary['unchanged'].all():
+        print('   Output unchanged, nothing to upload')
+    os.makedirs(os.path.join(output_dir, DELTA_DIR), exist_ok=True)
+    summary.to_csv(os.path.join(output_dir, DELTA_DIR, DELTA_SUMMARY_FILE), index=False)
@@ -1,5 +1,14 @@
 from __future__ import annotations
 
+# to run blocking requests from asyncio
+import asyncio
+import concurrent.futures
+import functools
+# for rate limiting and retries
+import email.utils
+import random
+import threading
+import time
 # to handle  data retrieval
 import urllib3
 # from urllib3 import request
@@ -23,20 +32,130 @@ class RestError(Exception):
     def __str__(self):
         return repr(self.value);
 
+# Responses that are worth retrying: the API is throttling us or is
+# temporarily unavailable.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Default request rate limit: requests per second, and the size of bursts.
+DEFAULT_RATE = 10.0
+DEFAULT_BURST = 10
+
+class RateLimiter:
+    """Token bucket allowing "rate" requests per second with bursts of up to
+    "burst" requests. Safe to share between threads."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._not_before = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Takes a token, sleeping until one is available. Returns the number
+        of seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now, so that waiting threads are served in order.
+            self._tokens -= 1
+            wait = max(-self._tokens / self.rate, self._not_before - now, 0.0)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds: float):
+        """Holds back all requests for the given number of seconds, e.g. to
+        honour a Retry-After header."""
+        with self._lock:
+            self._not_before = max(self._not_before, time.monotonic() + seconds)
+
+def _parse_retry_after(value: str) -> float:
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+def _project(record: dict, columns: set) -> dict:
+    # Keeps the fields of a decoded JSON record that json_normalize() would
+    # turn into one of the columns, e.g. {"Facility": {"Name": ...}} for
+    # "Facility.Name".
+    projected = {}
+    for key, value in record.items():
+        if key in columns:
+            projected[key] = value
+            continue
+        prefix = key + '.'
+        nested = set(column[len(prefix):] for column in columns if column.startswith(prefix))
+        if nested and isinstance(value, dict):
+            projected[key] = _project(value, nested)
+    return projected
+
+def _project_records(data, columns: set):
+    if isinstance(data, dict):
+        return _project(data, columns)
+    return [_project(record, columns) if isinstance(record, dict) else record for record in data]
+
 class Extract:
     MAIN_URL = 'https://app.sycamoreschool.com/api/v1'
 
-    def __init__(self, school_id: int, token: str):
+    def __init__(self, school_id: int, token: str, connections: int = 10,
+                 rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST,
+                 max_retries: int = 5, backoff: float = 0.5, max_backoff: float = 60.0):
         self.school_id = school_id
         self.token = token
 
+        # Requests per second, None or 0 for no limit.
+        self.limiter = RateLimiter(rate, burst) if rate else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._counter_lock = threading.Lock()
+        self.retries = 0
+        self.throttled_waits = 0
+        self.throttled_seconds = 0.0
+
+        # The pool manager is thread-safe. Keep up to "connections" connections
+        # alive so that concurrent callers don't have to reconnect.
         self.http = urllib3.PoolManager(
+            maxsize=connections,
             cert_reqs='CERT_REQUIRED',
             ca_certs=certifi.where(),
             headers={'Authorization': 'Bearer ' + self.token,
                      'Content-type': 'application/json; charset=utf-8'})
 
 
+    def counters(self) -> Dict[str, float]:
+        with self._counter_lock:
+            return {'retries': self.retries,
+                    'throttled_waits': self.throttled_waits,
+                    'throttled_seconds': round(self.throttled_seconds, 1)}
+
+    def _countWait(self, seconds: float, retry: bool = False):
+        with self._counter_lock:
+            if retry:
+                self.retries += 1
+            if seconds > 0:
+                self.throttled_waits += 1
+                self.throttled_seconds += seconds
+
+    def _backoff(self, attempt: int) -> float:
+        # Exponential backoff with "full jitter", so that concurrent callers
+        # don't retry in lockstep.
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+
     def _retrieve(self, query: str) -> Dict[str, str]:
         # handle certificate verification and SSL warnings
         # https://urllib3.readthedocs.io/en/latest/user-guide.html#ssl
@@ -44,8 +163,37 @@ class Extract:
         # get data from the API
         url = self.MAIN_URL + query
         logging.debug(url)
-        response = self.http.request('GET', url)
-        
+
+        attempt = 0
+        while True:
+            if self.limiter:
+                self._countWait(self.limiter.acquire())
+
+            try:
+                response = self.http.request('GET', url)
+            except urllib3.exceptions.HTTPError as ex:
+                if attempt >= self.max_retries:
+                    raise RestError('Request ' + url + ' failed with ' + str(ex))
+                response = None
+
+            if response is not None and response.status not in RETRY_STATUSES:
+                break
+            if response is not None and attempt >= self.max_retries:
+                break
+
+            wait = self._backoff(attempt)
+            if response is not None:
+                retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+                if retry_after is not None:
+                    # Don't let a bad header stall the request for good.
+                    wait = min(retry_after, self.max_backoff)
+                    if self.limiter:
+                        self.limiter.pause(wait)
+            logging.info('Retrying %s in %.1f seconds (attempt %d)', url, wait, attempt + 1)
+            self._countWait(wait, retry=True)
+            time.sleep(wait)
+            attempt += 1
+
         if response.status == 204:
             return None
 
@@ -58,12 +206,21 @@ class Extract:
     def get(self, entity: SycamoreEntity.Definition, entity_id: str = None) -> pandas.DataFrame:
         logging.debug(entity)
         data = self._retrieve(entity.url.format(school_id=self.school_id, entity_id=entity_id))
+        return self._toDataFrame(entity, data, entity_id)
+
+    def _toDataFrame(self, entity: SycamoreEntity.Definition, data, entity_id: str = None) -> pandas.DataFrame:
         if data is None:
             return None
         if entity.data_location is not None:
             data = data[entity.data_location]
         if entity.iterate_over is not None and type(data) is not list:
             data = [data]
+        if entity.columns is not None:
+            # Drop the fields that aren't needed before they are flattened.
+            columns = set(entity.columns)
+            if entity.index_col is not None:
+                columns.add(entity.index_col)
+            data = _project_records(data, columns)
 
         index_val = None
         if entity.index_col is not None:
@@ -76,3 +233,39 @@ class Extract:
         data_frame = pandas.json_normalize(data)
         data_frame.set_index(keys=index_col, inplace=True)
         return data_frame
+
+class AsyncExtract:
+    """Asyncio counterpart of Extract.
+
+    get() has the same contract as Extract.get(), but is a coroutine, so many
+    requests can be in flight at the same time. At most "concurrency" requests
+    run at once, sharing as many kept-alive connections.
+    """
+
+    def __init__(self, school_id: int, token: str, concurrency: int = 8, **kwargs):
+        self.school_id = school_id
+        self.concurrency = concurrency
+
+        # urllib3 is blocking, so requests run on a small thread pool that's
+        # sized to match the connection pool. Rate limiting and retries are
+        # handled by the wrapped Extract, see its arguments.
+        self._extract = Extract(school_id=school_id, token=token, connections=concurrency, **kwargs)
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        self._semaphore = None
+        self._loop = None
+
+    def _getSemaphore(self) -> asyncio.Semaphore:
+        # A semaphore can only be used from the event loop it was first used in.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def counters(self) -> Dict[str, float]:
+        return self._extract.counters()
+
+    async def get(self, entity: SycamoreEntity.Definition, entity_id: str = None) -> pandas.DataFrame:
+        async with self._getSemaphore():
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, functools.partial(self._extract.get, entity, entity_id=entity_id))
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import json
+import os
+import pandas
+
+# pyarrow is optional, without it only the pickle format is available.
+try:
+    import pyarrow
+    import pyarrow.feather
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+##
+
+# Arrow IPC ("feather") files are written uncompressed, so they load fast and
+# can be memory-mapped. Parquet files are compressed and smaller.
+EXTENSIONS = {
+    'pickle': '.pkl',
+    'feather': '.feather',
+    'parquet': '.parquet',
+}
+
+DEFAULT_FORMAT = 'feather' if pyarrow is not None else 'pickle'
+
+# Columnar formats can't store the index of a frame, so it's stored in a
+# column with this name.
+INDEX_COLUMN = '__index__'
+# Key of the schema metadata that records how to restore the frame.
+METADATA_KEY = b'sycamore'
+
+class UnsupportedFormat(Exception):
+    pass
+
+def check_format(format: str):
+    if format not in EXTENSIONS:
+        raise UnsupportedFormat('unknown format "{}"'.format(format))
+    if format != 'pickle' and pyarrow is None:
+        raise UnsupportedFormat('format "{}" requires pyarrow'.format(format))
+
+def resident_memory() -> int:
+    """Returns the resident memory of this process in bytes, or None if it
+    can't be determined."""
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def path(directory: str, name: str, format: str) -> str:
+    return os.path.join(directory, name + EXTENSIONS[format])
+
+def _is_native(series: pandas.Series) -> bool:
+    # Columns of strings (with None for missing values) and non-object columns
+    # are stored as they are. Everything else, e.g. the lists of dicts in
+    # "Local.General" or mixed ints and NaN, is stored as JSON so it is
+    # restored exactly.
+    if series.dtype != object:
+        return True
+    return all(value is None or isinstance(value, str) for value in series)
+
+def _encode(frame: pandas.DataFrame):
+    index_name = frame.index.name
+    frame = frame.rename_axis(INDEX_COLUMN).reset_index()
+
+    json_columns = []
+    for column in frame.columns:
+        if not _is_native(frame[column]):
+            frame[column] = frame[column].map(json.dumps)
+            json_columns.append(column)
+
+    table = pyarrow.Table.from_pandas(frame, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps({'index_name': index_name, 'json_columns': json_columns}).encode('utf-8')
+    return table.replace_schema_metadata(metadata)
+
+def _decode(table, columns: list = None, split_blocks: bool = False) -> pandas.DataFrame:
+    info = json.loads(table.schema.metadata[METADATA_KEY].decode('utf-8'))
+    # Keep integer columns with missing values as objects, like the frames
+    # built by the REST interface. Not consolidating the columns into blocks
+    # lets numeric columns without missing values point into the table's
+    # memory, which is the memory-mapped file if it was mapped.
+    frame = table.to_pandas(integer_object_nulls=True, split_blocks=split_blocks)
+    for column in info['json_columns']:
+        if column in frame.columns:
+            frame[column] = frame[column].map(json.loads)
+
+    frame = frame.set_index(INDEX_COLUMN)
+    frame.index.name = info['index_name']
+    if columns is not None:
+        frame = frame[columns]
+    return frame
+
+def save(frame: pandas.DataFrame, file_path: str, format: str):
+    check_format(format)
+    # Write to a temporary file first, so readers never see a partial file.
+    temp_path = file_path + '.tmp'
+    if format == 'pickle':
+        frame.to_pickle(temp_path)
+    elif format == 'feather':
+        pyarrow.feather.write_feather(_encode(frame), temp_path, compression='uncompressed')
+    else:
+        pyarrow.parquet.write_table(_encode(frame), temp_path)
+    os.replace(temp_path, file_path)
+
+def load(file_path: str, format: str, columns: list = None, memory_map: bool = False) -> pandas.DataFrame:
+    """Loads a frame saved with save(). If columns is set, only these columns
+    are read (for columnar formats) and returned.
+
+    memory_map only applies to the feather format. The file is mapped instead
+    of read, so processes loading the same file share the page cache for its
+    numeric columns. Strings and JSON columns are still copied."""
+    check_format(format)
+    if format == 'pickle':
+        frame = pandas.read_pickle(file_path)
+        return frame if columns is None else frame[columns]
+
+    read_columns = None if columns is None else [INDEX_COLUMN] + list(columns)
+    if format == 'feather':
+        table = pyarrow.feather.read_table(file_path, columns=read_columns, memory_map=memory_map)
+        return _decode(table, columns, split_blocks=memory_map)
+
+    table = pyarrow.parquet.read_table(file_path, columns=read_columns)
+    return _decode(table, columns)
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from lib import Frames
+from lib import Generators
+from lib import SycamoreCache
+from lib import Usernames
+import pandas
+import threading
+
+##
+
+def validContacts(sycFamilyContacts: pandas.DataFrame) -> pandas.DataFrame:
+    """The rows of family contacts with an e-mail address, first and last
+    name."""
+    valid = (Frames.truthy(sycFamilyContacts['Email'])
+             & Frames.truthy(sycFamilyContacts['FirstName'])
+             & Frames.truthy(sycFamilyContacts['LastName']))
+    return sycFamilyContacts.loc[valid.to_numpy()]
+
+class Views:
+    """Intermediate results several exporters need, computed once per cache
+    and shared between the exporters that run on it.
+
+    accounts are the existing accounts for usernames(), see
+    Usernames.loadAccounts()."""
+
+    def __init__(self, sycamore: SycamoreCache.Cache, accounts: dict = None):
+        self.sycamore = sycamore
+        self.accounts = accounts
+        self._results = {}
+        self._lock = threading.RLock()
+
+    def _memoize(self, key, compute):
+        with self._lock:
+            if key not in self._results:
+                self._results[key] = compute()
+            return self._results[key]
+
+    def currentYear(self) -> pandas.Series:
+        """The details of the current school year, None if there is none."""
+        def compute():
+            sycYears = self.sycamore.get('years')
+            current = sycYears.index[sycYears['Current'].to_numpy(dtype=bool)]
+            if len(current) == 0:
+                return None
+            return self.sycamore.get('years_details').loc[current[0]]
+        return self._memoize('currentYear', compute)
+
+    def studentDetails(self) -> pandas.DataFrame:
+        """The details of all students with a grade, in the order of
+        'students'."""
+        def compute():
+            sycStudentDetails = self.sycamore.get('student_details').loc[self.sycamore.get('students').index]
+
+            emptyGrade = sycStudentDetails['Grade'].isna().to_numpy()
+            for index in sycStudentDetails.index[emptyGrade]:
+                print('Skipping student "{}" with empty grade'.format(index))
+            return sycStudentDetails.loc[~emptyGrade]
+        return self._memoize('studentDetails', compute)
+
+    def usernames(self) -> dict:
+        """The e-mail addresses of teachers(), of the students in
+        studentDetails() and of the students without a grade, as 'teachers',
+        'students' and 'ungradedStudents', with collisions resolved by a
+        Usernames.UsernameIndex.
+
+        Existing teacher addresses are kept as they are. The generated
+        addresses are resolved teachers first, then students and then
+        students without a grade, each in order of their ID."""
+        def compute():
+            index = Usernames.UsernameIndex(self.accounts)
+            sycTeachers = self.teachers()
+            teacherEmails = Generators.createTeacherEmailAddresses(
+                sycTeachers['FirstName'], sycTeachers['LastName'], sycTeachers['Email1'], include_domain=True)
+            hasOwn = sycTeachers['Email1'].str.strip().str.endswith(Generators.TEACHER_DOMAIN, na=False).to_numpy()
+            for teacherId, email in sorted(zip(sycTeachers.index[hasOwn], teacherEmails[hasOwn])):
+                index.claim(email, Usernames.EMPLOYEE, teacherId)
+            teacherEmails[~hasOwn] = index.resolveSeries(
+                teacherEmails[~hasOwn], Usernames.EMPLOYEE, sycTeachers.index[~hasOwn]).to_numpy()
+
+            sycStudentDetails = self.studentDetails()
+            studentEmails = index.resolveSeries(
+                Generators.createStudentEmailAddresses(sycStudentDetails['FirstName'], sycStudentDetails['LastName']),
+                Usernames.STUDENT, sycStudentDetails.index)
+
+            sycStudents = self.sycamore.get('students')
+            ungraded = sycStudents.index[~sycStudents.index.isin(sycStudentDetails.index)]
+            sycUngradedDetails = self.sycamore.get('student_details').loc[ungraded]
+            ungradedEmails = index.resolveSeries(
+                Generators.createStudentEmailAddresses(sycUngradedDetails['FirstName'], sycUngradedDetails['LastName']),
+                Usernames.STUDENT, sycUngradedDetails.index)
+
+            index.printReport()
+            return {'teachers': teacherEmails, 'students': studentEmails, 'ungradedStudents': ungradedEmails}
+        return self._memoize('usernames', compute)
+
+    def studentEmails(self, include_domain: bool = True) -> pandas.Series:
+        """The e-mail address of every student in studentDetails()."""
+        def compute():
+            studentEmails = self.usernames()['students']
+            if include_domain:
+                return studentEmails
+            return studentEmails.str.replace(Generators.STUDENT_DOMAIN, '', regex=False)
+        return self._memoize(('studentEmails', include_domain), compute)
+
+    def allStudentEmails(self, include_domain: bool = True) -> pandas.Series:
+        """The e-mail address of every student in 'students', including the
+        students without a grade."""
+        def compute():
+            usernames = self.usernames()
+            studentEmails = pandas.concat([usernames['students'], usernames['ungradedStudents']]) \
+                .reindex(self.sycamore.get('students').index)
+            if include_domain:
+                return studentEmails
+            return studentEmails.str.replace(Generators.STUDENT_DOMAIN, '', regex=False)
+        return self._memoize(('allStudentEmails', include_domain), compute)
+
+    def teacherEmails(self, include_domain: bool = True) -> pandas.Series:
+        """The e-mail address of every teacher in teachers()."""
+        def compute():
+            teacherEmails = self.usernames()['teachers']
+            if include_domain:
+                return teacherEmails
+            return teacherEmails.str.replace(Generators.TEACHER_DOMAIN, '', regex=False)
+        return self._memoize(('teacherEmails', include_domain), compute)
+
+    def teachers(self) -> pandas.DataFrame:
+        """The active and current teachers and substitutes."""
+        def compute():
+            sycEmployees = self.sycamore.get('employees')
+            return sycEmployees.loc[(sycEmployees['Position'].isin(['Teacher', 'Substitute'])
+                                     & sycEmployees['Active']
+                                     & sycEmployees['Current']).to_numpy(dtype=bool)]
+        return self._memoize('teachers', compute)
+
+    def primaryContacts(self) -> pandas.DataFrame:
+        """The primary contacts of all families, in the order of
+        'family_contacts'."""
+        def compute():
+            sycFamilyContacts = self.sycamore.get('family_contacts')
+            return sycFamilyContacts.loc[sycFamilyContacts['PrimaryParent'].to_numpy(dtype=bool)]
+        return self._memoize('primaryContacts', compute)
+
+    def validFamilyContacts(self) -> pandas.DataFrame:
+        """The family contacts with an e-mail address, first and last name."""
+        def compute():
+            return validContacts(self.sycamore.get('family_contacts'))
+        return self._memoize('validFamilyContacts', compute)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import collections
+import json
+import logging
+import numpy
+import pandas
+import threading
+
+##
+
+class UnknownTranslation(Exception):
+    pass
+
+# Passed as unknown or missing to keep the original value.
+KEEP = object()
+
+class Translation:
+    """Translates the values of one Sycamore field, e.g. a grade or a
+    relationship, with a mapping.
+
+    Values that aren't strings are missing and translate to missing. Values
+    that aren't in the mapping are unknown and translate to unknown. If
+    message is set, the unknown values are counted and report() logs each of
+    them once."""
+    def __init__(self, name: str, mapping: dict, unknown=KEEP, missing=KEEP, strip: bool = False,
+                 message: str = None, record: str = None, missing_message: str = None):
+        self.name = name
+        self.mapping = dict(mapping)
+        self.unknown = unknown
+        self.missing = missing
+        self.strip = strip
+        self.message = message
+        self.record = record
+        self.missing_message = missing_message
+        # Counted by translate() and translateSeries() until the next report(),
+        # which may be called from several output threads.
+        self._lock = threading.Lock()
+        self.missing_count = 0
+        self.unknown_counts = collections.Counter()
+        # Unknown value -> IDs of the records it was seen for
+        self.unknown_records = {}
+
+    def __str__(self):
+        return self.name
+
+    def _key(self, value):
+        return value.strip() if self.strip and isinstance(value, str) else value
+
+    def _countMissing(self, count: int):
+        with self._lock:
+            self.missing_count += count
+
+    def _countUnknown(self, key: str, count: int, record_id=None):
+        with self._lock:
+            self.unknown_counts[key] += count
+            if self.record and record_id is not None:
+                self.unknown_records.setdefault(key, []).append(record_id)
+
+    def translate(self, value, record_id=None):
+        if not isinstance(value, str):
+            if self.missing_message:
+                self._countMissing(1)
+            return value if self.missing is KEEP else self.missing
+
+        key = self._key(value)
+        if key in self.mapping:
+            return self.mapping[key]
+
+        if self.message:
+            self._countUnknown(key, 1, record_id)
+        return key if self.unknown is KEEP else self.unknown
+
+    def translateSeries(self, values: pandas.Series) -> pandas.Series:
+        """translate() for a whole Series."""
+        # Map the values rather than the categories of categorical columns.
+        values = values.astype(object)
+        isString = values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+        keys = values.map(self._key) if self.strip else values
+        known = keys.isin(list(self.mapping)).to_numpy() & isString
+        unknown = ~known & isString
+
+        result = keys.map(self.mapping).to_numpy(dtype=object)
+        result[unknown] = _values(keys, self.unknown)[unknown]
+        result[~isString] = _values(values, self.missing)[~isString]
+
+        if self.missing_message and not isString.all():
+            self._countMissing(int((~isString).sum()))
+        if self.message:
+            for key, count in keys[unknown].value_counts(sort=False).items():
+                self._countUnknown(key, int(count))
+        return pandas.Series(result, index=values.index, dtype=object)
+
+    def report(self):
+        """Logs the missing and unknown values counted since the last report,
+        once each with the number of times they occurred."""
+        with self._lock:
+            missing, self.missing_count = self.missing_count, 0
+            unknown, self.unknown_counts = self.unknown_counts, collections.Counter()
+            records, self.unknown_records = self.unknown_records, {}
+
+        if missing:
+            logging.warning('%s (%d times)', self.missing_message, missing)
+        for key, count in unknown.items():
+            message = self.message.format(value=key)
+            if key in records:
+                message += ' for {} {}'.format(self.record, ', '.join('"{}"'.format(record_id)
+                                                                      for record_id in records[key]))
+            logging.warning('%s (%d times)', message, count)
+
+def _values(values: pandas.Series, value) -> numpy.ndarray:
+    if value is KEEP:
+        return values.to_numpy(dtype=object)
+    return numpy.full(len(values.index), value, dtype=object)
+
+TRANSLATIONS = [
+    Translation('grade', {
+        'Preschool': 'Prekindergarten',
+        'Kindergarten': 'Kindergarten',
+        '1st': '1',
+        '2nd': '2',
+        '3rd': '3',
+        '4th': '4',
+        '5th': '5',
+        '6th': '6',
+        '7th': '7',
+        '8th': '8',
+        '9th - DSD 1': '9',
+        '10th - DSD 2 y1': '10',
+        '11th - DSD 2 y2': '11',
+        '10th (no DSD 2)': '12',
+        }, missing='', message='Could not translate grade "{value}"',
+        missing_message='Translating None grade to ""'),
+    Translation('term', {
+        'First': 'S1',
+        'Second': 'S2',
+        'Full Year': 'Year',
+        }, message='Could not translate term "{value}"'),
+    Translation('period', {
+        'Beginner\'s Class': 'Adlt',
+        'Conversation Class German': 'Adlt',
+        }, unknown='GP', missing='GP'),
+    # Clever guardian roles
+    Translation('role', {
+        'Mother': 'Parent',
+        'Father': 'Parent',
+        'Parents': 'Parent',
+        'Grandmother': 'Relative',
+        '': 'Parent',
+        'Aunt': 'Relative',
+        'Close Friend': 'Other',
+        'Colleague': 'Other',
+        'Grandfather': 'Relative',
+        'Grandparents': 'Relative',
+        'Nanny': 'Aide',
+        'Not Defined': 'Other',
+        'Relative': 'Relative',
+        'Sibling': 'Relative',
+        'Uncle': 'Relative',
+        }, unknown='Parent', missing='Parent', strip=True, message='Unsupported relationship "{value}"'),
+    # SDS 2.1 user and relationship roles
+    Translation('user_role', {
+        'Teacher': 'teacher',
+        'Substitute': 'substitute',
+        }, unknown='other', missing='teacher', strip=True,
+        message='Unsupported employee position "{value}"', record='employee'),
+    Translation('relationship_role', {
+        'Mother': 'parent',
+        'Father': 'parent',
+        'Stepmother': 'parent',
+        'Stepfather': 'parent',
+        'Parents': 'parent',
+        'Grandmother': 'relative',
+        '': 'parent',
+        'Aunt': 'relative',
+        'Close Friend': 'other',
+        'Colleague': 'other',
+        'Grandfather': 'relative',
+        'Grandparents': 'relative',
+        'Nanny': 'aide',
+        'Not Defined': 'other',
+        'Relative': 'relative',
+        'Sibling': 'relative',
+        'Uncle': 'relative',
+        'Partner': 'guardian',
+        'DayCare Provider': 'aide',
+        'Helper': 'aide',
+        'Student': 'other',
+        }, unknown='other', missing='parent', strip=True,
+        message='Unknown relationship "{value}"', record='contact'),
+]
+
+_translations = {translation.name: translation for translation in TRANSLATIONS}
+
+def get(name: str) -> Translation:
+    if name not in _translations:
+        raise UnknownTranslation('Unknown translation "{}"'.format(name))
+    return _translations[name]
+
+def translate(name: str, value, record_id=None):
+    return get(name).translate(value, record_id)
+
+def translateSeries(name: str, values: pandas.Series) -> pandas.Series:
+    return get(name).translateSeries(values)
+
+def report():
+    """Logs the missing and unknown values of all translations, see
+    Translation.report()."""
+    for translation in TRANSLATIONS:
+        translation.report()
+
+def load(path: str):
+    """Adds the values of a JSON file to the translations, e.g.
+    {"relationship_role": {"Godmother": "relative"}}, so new values don't need
+    a code change. Values in the file replace the built-in ones."""
+    with open(path, 'r') as translations_file:
+        translations = json.load(translations_file)
+    for name, mapping in translations.items():
+        get(name).mapping.update(mapping)
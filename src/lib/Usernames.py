@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import pandas
+import re
+
+from lib import Generators
+
+##
+
+class UnknownOwnerKind(Exception):
+    pass
+
+# Kinds of owners. Students and employees are numbered independently in
+# Sycamore, so an owner is identified by its kind and its ID.
+STUDENT = 'student'
+EMPLOYEE = 'employee'
+KINDS = [STUDENT, EMPLOYEE]
+
+def _owner(kind: str, owner_id) -> tuple:
+    if kind not in KINDS:
+        raise UnknownOwnerKind('Unknown owner kind "{}"'.format(kind))
+    # IDs read from files are strings, those from Sycamore are numbers.
+    return (kind, str(owner_id))
+
+def _ownerName(owner: tuple) -> str:
+    return None if owner is None else '{} {}'.format(*owner)
+
+class UsernameIndex:
+    """Hands out unique usernames (e-mail addresses). A username that is
+    already taken by someone else gets the lowest free numeric suffix, e.g.
+    Anna.Mueller2@student.gssb.org. resolveSeries() resolves usernames in
+    order of owner ID, so the suffixes don't depend on the order of the rows
+    and the owner with the lowest ID keeps the username without suffix.
+
+    accounts maps the usernames of existing accounts to the (kind, ID) of
+    their owner, or None if it isn't known. An owner keeps their existing
+    account if it is a variant of the username generated for them."""
+    def __init__(self, accounts: dict = None):
+        # Lower case username -> owner
+        self.owners = {}
+        # Owner -> usernames of their existing accounts
+        self.accounts = {}
+        # Lower case username -> the last suffix handed out for it, so common
+        # names don't have to try all the suffixes again
+        self.suffixes = {}
+        self.collisions = []
+        for username, owner in (accounts or {}).items():
+            if owner is None:
+                self.owners.setdefault(username.lower(), None)
+                continue
+            self.claim(username, *owner)
+            self.accounts.setdefault(_owner(*owner), []).append(username)
+
+    def claim(self, username: str, kind: str, owner_id):
+        """Takes a username as it is, e.g. an address that already exists."""
+        self.owners.setdefault(username.lower(), _owner(kind, owner_id))
+
+    def resolve(self, username: str, kind: str, owner_id) -> str:
+        if not isinstance(username, str):
+            return username
+        owner = _owner(kind, owner_id)
+        local, at, domain = username.partition('@')
+
+        variant = re.compile(re.escape(local) + r'\d*' + re.escape(at + domain), re.IGNORECASE)
+        for account in self.accounts.get(owner, []):
+            if variant.fullmatch(account):
+                self.owners[account.lower()] = owner
+                return account
+
+        resolved = username
+        number = self.suffixes.get(username.lower(), 1)
+        while self.owners.get(resolved.lower(), owner) != owner:
+            number += 1
+            resolved = '{}{}{}{}'.format(local, number, at, domain)
+        if resolved != username:
+            self.suffixes[username.lower()] = number
+            self.collisions.append({'Owner': _ownerName(owner), 'Username': username,
+                                    'TakenBy': _ownerName(self.owners[username.lower()]), 'Resolved': resolved})
+        self.owners[resolved.lower()] = owner
+        return resolved
+
+    def resolveSeries(self, usernames: pandas.Series, kind: str, owner_ids) -> pandas.Series:
+        """resolve() for every username, owner_ids are the IDs of their
+        owners. The usernames are resolved in order of owner ID."""
+        owner_ids = list(owner_ids)
+        resolved = [None] * len(owner_ids)
+        for position in sorted(range(len(owner_ids)), key=lambda position: owner_ids[position]):
+            resolved[position] = self.resolve(usernames.iloc[position], kind, owner_ids[position])
+        return pandas.Series(resolved, index=usernames.index, dtype=object)
+
+    def report(self) -> pandas.DataFrame:
+        return pandas.DataFrame(self.collisions, columns=['Owner', 'Username', 'TakenBy', 'Resolved'])
+
+    def printReport(self):
+        if not self.collisions:
+            return
+        print('Resolved {} username collisions:'.format(len(self.collisions)))
+        for collision in self.collisions:
+            print('   "{}" of "{}" is taken by "{}", using "{}"'.format(
+                collision['Username'], collision['Owner'], collision['TakenBy'], collision['Resolved']))
+
+def loadAccounts(path: str) -> dict:
+    """Reads the existing accounts from a CSV file with a Username column
+    and, optionally, an ID column with the Sycamore ID of the owner and a
+    Kind column with "student" or "employee". Without a Kind, accounts in
+    the student domain belong to students and all others to employees."""
+    accounts = pandas.read_csv(path, dtype=str, keep_default_na=False)
+    rows = len(accounts.index)
+    owners = accounts['ID'] if 'ID' in accounts.columns else [''] * rows
+    kinds = accounts['Kind'] if 'Kind' in accounts.columns else [''] * rows
+
+    result = {}
+    for username, owner, kind in zip(accounts['Username'], owners, kinds):
+        username = username.strip()
+        if not username:
+            continue
+        if not owner:
+            result[username] = None
+            continue
+        if not kind:
+            kind = STUDENT if username.lower().endswith(Generators.STUDENT_DOMAIN) else EMPLOYEE
+        result[username] = (kind.strip().lower(), owner)
+    return result
@@ -0,0 +1,78 @@
+import argparse
+import importlib
+import json
+import os
+import pandas
+import sys
+import time
+
+# Runs an exporter of a baseline tree, e.g. one extracted from git by
+# BenchmarkExporters.py, on synthetic frames. It runs in its own process, so
+# the baseline's lib modules don't mix with the current ones.
+
+# Module and class of each exporter in the baseline tree.
+EXPORTERS = {
+    'sds21': ('sds.ExtractFromSycamoreToSDS21', 'CleverCreator'),
+    'clever': ('sds.ExtractFromSycamoreToSDSClever', 'CleverCreator'),
+    'registration': ('extract.ExtractForRegistration', 'RegistrationCreator'),
+}
+
+##
+
+class School:
+    """The synthetic frames as the baseline exporters read them: untyped, as
+    they come from the REST interface."""
+    def __init__(self, entities: dict):
+        self.entities = entities
+
+    def get(self, name: str) -> pandas.DataFrame:
+        return self.entities[name]
+
+def createCreator(exporter: str, school_id: int, entities: dict, output_dir: str):
+    module_name, class_name = EXPORTERS[exporter]
+    creator_class = getattr(importlib.import_module(module_name), class_name)
+    # The baseline constructors load the cache from Sycamore, so set the
+    # creator up without them.
+    creator = creator_class.__new__(creator_class)
+    creator.school_id = school_id
+    creator.cache_dir = None
+    creator.output_dir = output_dir
+    creator.xlsx_output = False
+    creator.sycamore = School(entities)
+    return creator
+
+def timeGenerators(creator) -> dict:
+    timings = {}
+    for name in sorted(dir(creator)):
+        if name.startswith('generate') and name != 'generate':
+            start = time.monotonic()
+            getattr(creator, name)()
+            timings[name] = time.monotonic() - start
+    return timings
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Time a baseline exporter on synthetic frames')
+    parser.add_argument('--src', dest='src_dir', action='store',
+                        required=True, help='src directory of the baseline tree')
+    parser.add_argument('--exporter', dest='exporter', action='store',
+                        choices=sorted(EXPORTERS), required=True, help='Exporter to run')
+    parser.add_argument('--school', dest='school_id', action='store',
+                        type=int, required=True, help='Sycamore school ID')
+    parser.add_argument('--entities', dest='entities_path', action='store',
+                        required=True, help='Pickle of a dict from entity name to frame')
+    parser.add_argument('--out', dest='output_dir', action='store',
+                        required=True, help='Output directory')
+    parser.add_argument('--timings', dest='timings_path', action='store',
+                        required=True, help='JSON file to write the timings of the generators to')
+    return parser.parse_args()
+
+if __name__ == "__main__" :
+    args = parse_arguments()
+    # Import from the baseline tree rather than the directory of this script.
+    sys.path[0] = os.path.abspath(args.src_dir)
+    os.chdir(args.src_dir)
+    creator = createCreator(args.exporter, args.school_id, pandas.read_pickle(args.entities_path), args.output_dir)
+    timings = timeGenerators(creator)
+    creator.generate()
+    with open(args.timings_path, 'w') as timings_file:
+        json.dump(timings, timings_file)
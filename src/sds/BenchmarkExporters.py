@@ -0,0 +1,295 @@
+import argparse
+import filecmp
+import io
+import json
+import os
+import pandas
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+# append the path of the parent directory
+sys.path.append("..")
+sys.path.append(".")
+
+from extract import ExtractForRegistration
+from lib import SycamoreCache
+from lib import SycamoreStorage
+from sds import ExtractFromSycamoreToSDS21
+from sds import ExtractFromSycamoreToSDSClever
+
+SCHOOL_ID = 1234
+
+# Size of the synthetic school at scale 1, roughly the size of the real one.
+FAMILIES = 300
+STUDENTS_PER_FAMILY = 2
+CONTACTS_PER_FAMILY = 2
+CLASSES = 60
+CLASSES_PER_STUDENT = 2
+EMPLOYEES = 80
+
+FIRST_NAMES = ['Anna', 'Ben', 'Clara', 'David', 'Emma', 'Felix', 'Greta', 'Hans', 'Ida', 'Jonas']
+LAST_NAMES = ['Müller', 'Schmidt', 'von Weber', 'Fischer', 'de Wagner', 'Becker', 'Schäfer', 'Koch', 'Bauer', 'Richter']
+RELATIONS = ['Mother', 'Father', 'Grandmother', 'Nanny', '', None]
+GRADES = ['Kindergarten', '1st', '2nd', '3rd', '4th', '5th', '9th - DSD 1', '10th (no DSD 2)', 'Adult', None]
+POSITIONS = ['Teacher', 'Substitute', 'Administrator']
+TERMS = ['Full Year', 'First', 'Second']
+
+EXPORTERS = {
+    'sds21': ExtractFromSycamoreToSDS21.CleverCreator,
+    'clever': ExtractFromSycamoreToSDSClever.CleverCreator,
+    'registration': ExtractForRegistration.RegistrationCreator,
+}
+
+# The git revision with the exporters before they were vectorized, to
+# compare with. It is run by BASELINE_RUNNER in a separate process.
+BASELINE_REVISION = '9106a5adc589c6415caac0419b7c47d8e91faf02'
+BASELINE_RUNNER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'BenchmarkBaseline.py')
+
+class EmptyReport(Exception):
+    pass
+
+class OutputMismatch(Exception):
+    pass
+
+##
+
+def _letters(number: int) -> str:
+    letters = ''
+    while number:
+        number, letter = divmod(number, 26)
+        letters = chr(ord('a') + letter) + letters
+    return letters
+
+def _name(names: list, number: int) -> str:
+    # Unique names, so no generated e-mail addresses collide and the output
+    # of the baseline exporters, which don't resolve collisions, can be
+    # compared with the current one.
+    return (names[number % len(names)] + _letters(number // len(names))
+            + (' ' if number % 7 == 0 else ''))
+
+def _phone(number: int) -> str:
+    if number % 5 == 0:
+        return ''
+    return '(617) 555-{:04d}'.format(number % 10000)
+
+def createSchool(scale: int) -> dict:
+    """Returns synthetic frames for the entities the exporters read, shaped
+    like the ones the cache builds from the REST interface."""
+    families = FAMILIES * scale
+    students = families * STUDENTS_PER_FAMILY
+    contacts = families * CONTACTS_PER_FAMILY
+    classes = CLASSES * scale
+    employees = EMPLOYEES * scale
+
+    entities = {}
+    entities['school'] = pandas.DataFrame({'Name': ['German School']}, index=[SCHOOL_ID])
+    entities['years'] = pandas.DataFrame({'Name': ['2023-2024', '2024-2025'], 'Current': ['0', '1']},
+                                         index=pandas.Index([1, 2], name='ID'))
+    entities['years_details'] = pandas.DataFrame({
+        'Name': ['2023-2024', '2024-2025'],
+        'Q1.StartDate': ['2023-09-09', '2024-09-07'],
+        'Q3.StartDate': ['2024-01-27', '2025-01-25'],
+        'EndDate': ['2024-06-08', '2025-06-07'],
+        }, index=[1, 2])
+
+    familyIds = pandas.Index(range(1000, 1000 + families), name='ID')
+    entities['families'] = pandas.DataFrame({
+        'Name': [_name(LAST_NAMES, number) for number in range(families)],
+        'Code': ['F{}'.format(number) for number in range(families)],
+        'Address': ['{} Main Street'.format(number) for number in range(families)],
+        'City': ['Boston' for number in range(families)],
+        'State': ['MA' for number in range(families)],
+        'ZIP': ['02{:03d}'.format(number % 1000) for number in range(families)],
+        }, index=familyIds)
+
+    contactIds = pandas.Index(range(100000, 100000 + contacts), name='ID')
+    entities['family_contacts'] = pandas.DataFrame({
+        'families_id': [familyIds[number % families] for number in range(contacts)],
+        'FirstName': [_name(FIRST_NAMES, number) for number in range(contacts)],
+        'LastName': [_name(LAST_NAMES, number) if number % 11 else '' for number in range(contacts)],
+        'Email': ['contact{}@example.com'.format(number) if number % 13 else None for number in range(contacts)],
+        'CellPhone': [_phone(number) for number in range(contacts)],
+        'WorkPhone': [_phone(number + 1) for number in range(contacts)],
+        'HomePhone': [_phone(number + 2) for number in range(contacts)],
+        'Relation': [RELATIONS[number % len(RELATIONS)] for number in range(contacts)],
+        'PrimaryParent': [1 if number % CONTACTS_PER_FAMILY == 0 else 0 for number in range(contacts)],
+        }, index=contactIds)
+
+    studentIds = pandas.Index(range(200000, 200000 + students), name='ID')
+    firstNames = [_name(FIRST_NAMES, number * 3) for number in range(students)]
+    lastNames = [_name(LAST_NAMES, number // STUDENTS_PER_FAMILY) for number in range(students)]
+    entities['students'] = pandas.DataFrame({
+        'FirstName': firstNames,
+        'LastName': lastNames,
+        'FamilyID': [familyIds[number % families] for number in range(students)],
+        'StudentCode': ['s{}-Zz9'.format(number) for number in range(students)],
+        }, index=studentIds)
+    entities['student_details'] = pandas.DataFrame({
+        'FirstName': firstNames,
+        'LastName': lastNames,
+        'Grade': [GRADES[number % len(GRADES)] for number in range(students)],
+        'ExtID': [str(number) for number in range(students)],
+        'DOB': ['20{:02d}-0{}-1{}'.format(number % 18, number % 9 + 1, number % 10) if number % 23 else ''
+                for number in range(students)],
+        'StateID': [str(1000000 + number) if number % 4 else None for number in range(students)],
+        'Email': ['student{}@example.com'.format(number) if number % 3 else '' for number in range(students)],
+        'Code': ['pw{}'.format(number) for number in range(students)],
+        }, index=studentIds.rename(None))
+    entities['student_custom_fields'] = pandas.DataFrame({
+        'students_id': studentIds,
+        'Local.General': [[
+            {'Name': 'PhotoRelease', 'Value': 'Y' if number % 2 else 'N'},
+            {'Name': 'Allergies', 'Value': 'Peanuts' if number % 9 == 0 else ''},
+            {'Name': 'Permission for Nikolaus', 'Value': 'Yes' if number % 5 else None},
+            ] if number % 19 else [] for number in range(students)],
+        }, index=studentIds.rename(None))
+    entities['family_students'] = pandas.DataFrame({
+        'families_id': [familyIds[number % families] for number in range(students)],
+        'FirstName': firstNames,
+        'LastName': lastNames,
+        }, index=studentIds)
+
+    classIds = pandas.Index(range(300000, 300000 + classes), name='ID')
+    employeeIds = pandas.Index(range(400000, 400000 + employees), name='ID')
+    entities['classes'] = pandas.DataFrame({
+        'Name': ['Class {}'.format(number % 12) for number in range(classes)],
+        'Section': [str(number) if number % 3 else '' for number in range(classes)],
+        'PrimaryStaffID': [employeeIds[number % employees] if number % 17 else 0 for number in range(classes)],
+        'TermLength': [TERMS[number % len(TERMS)] for number in range(classes)],
+        }, index=classIds)
+    entities['class_details'] = pandas.DataFrame({
+        'Facility.Name': ['Room {}'.format(number % 40) for number in range(classes)],
+        }, index=classIds.rename(None))
+    entities['employees'] = pandas.DataFrame({
+        'FirstName': [_name(FIRST_NAMES, number) for number in range(employees)],
+        'LastName': [_name(LAST_NAMES, number + 3) for number in range(employees)],
+        'Email1': ['teacher{}@gssb.org'.format(number) if number % 2 else 'teacher{}@example.com'.format(number)
+                   for number in range(employees)],
+        'Position': [POSITIONS[number % len(POSITIONS)] for number in range(employees)],
+        'Active': [1 if number % 9 else 0 for number in range(employees)],
+        'Current': [1 if number % 10 else 0 for number in range(employees)],
+        # The first employee is the principal, who is their own manager.
+        'ManagerID': [employeeIds[0] for number in range(employees)],
+        }, index=employeeIds)
+
+    enrollments = students * CLASSES_PER_STUDENT
+    entities['student_classes'] = pandas.DataFrame({
+        'students_id': [studentIds[number // CLASSES_PER_STUDENT] for number in range(enrollments)],
+        'Name': ['Class {}'.format(number % 12) for number in range(enrollments)],
+        }, index=pandas.Index([classIds[number % classes] for number in range(enrollments)], name='ID'))
+    return entities
+
+def createCache(entities: dict, cache_dir: str) -> SycamoreCache.Cache:
+    for name, frame in entities.items():
+        SycamoreStorage.save(frame, SycamoreStorage.path(cache_dir, name, 'pickle'), 'pickle')
+    return SycamoreCache.Cache(cache_dir=cache_dir, format='pickle')
+
+def timeGenerators(creator) -> dict:
+    timings = {}
+    for name in sorted(dir(creator)):
+        if name.startswith('generate') and name != 'generate':
+            start = time.monotonic()
+            report = getattr(creator, name)()
+            timings[name] = time.monotonic() - start
+            if len(report.index) == 0:
+                raise EmptyReport('{}.{} returned no rows'.format(type(creator).__module__, name))
+    return timings
+
+def compareOutputs(baseline_dir: str, output_dir: str):
+    """Raises OutputMismatch unless every file written by the baseline
+    exporter was written byte for byte the same by the current one."""
+    names = sorted(os.listdir(baseline_dir))
+    _match, mismatch, errors = filecmp.cmpfiles(baseline_dir, output_dir, names, shallow=False)
+    if mismatch or errors:
+        raise OutputMismatch('Output differs from the baseline in {}: {}'.format(
+            output_dir, ', '.join(mismatch + errors)))
+
+def extractBaseline(revision: str, directory: str) -> str:
+    """Extracts the src directory of a git revision of this repository into
+    directory, and returns its path."""
+    repository = subprocess.run(['git', 'rev-parse', '--show-toplevel'], cwd=os.path.dirname(BASELINE_RUNNER),
+                                check=True, capture_output=True, text=True).stdout.strip()
+    archive = subprocess.run(['git', '-C', repository, 'archive', '--format=tar', revision, 'src'],
+                             check=True, capture_output=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(directory)
+    return os.path.join(directory, 'src')
+
+def runBaseline(baseline_src: str, exporter: str, entities: dict, output_dir: str) -> dict:
+    """Runs the exporter of the baseline tree in a separate process, and
+    returns the timings of its generators."""
+    with tempfile.TemporaryDirectory() as work_dir:
+        entities_path = os.path.join(work_dir, 'entities.pkl')
+        timings_path = os.path.join(work_dir, 'timings.json')
+        pandas.to_pickle(entities, entities_path)
+        subprocess.run([sys.executable, BASELINE_RUNNER, '--src', baseline_src, '--exporter', exporter,
+                        '--school', str(SCHOOL_ID), '--entities', entities_path,
+                        '--out', os.path.abspath(output_dir), '--timings', timings_path], check=True)
+        with open(timings_path, 'r') as timings_file:
+            return json.load(timings_file)
+
+def benchmark(exporter: str, scale: int, output_dir: str, baseline_src: str) -> tuple:
+    """Returns the timings of the baseline and the current exporter, after
+    checking that they write the same files."""
+    entities = createSchool(scale)
+    output_dir = os.path.join(output_dir, exporter, 'scale{}'.format(scale))
+    args = argparse.Namespace(school_id=SCHOOL_ID, xlsx_output=False, delta_output=False,
+                              translations=None, accounts=None)
+
+    baseline_dir = os.path.join(output_dir, 'baseline')
+    os.makedirs(baseline_dir, exist_ok=True)
+    baseline = runBaseline(baseline_src, exporter, entities, baseline_dir)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        sycamore = createCache(entities, cache_dir)
+        args.cache_dir = cache_dir
+        args.output_dir = os.path.join(output_dir, 'current')
+        os.makedirs(args.output_dir, exist_ok=True)
+        creator = EXPORTERS[exporter](args, sycamore=sycamore)
+        # Load all entities first, so only the exporter is timed.
+        for entity in SycamoreCache.ENTITIES:
+            if os.path.exists(SycamoreStorage.path(cache_dir, entity.name, 'pickle')):
+                sycamore.get(entity.name)
+        current = timeGenerators(creator)
+        creator.generate()
+
+    compareOutputs(baseline_dir, args.output_dir)
+    return baseline, current
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description='Time the exporters on a synthetic school')
+    parser.add_argument('--exporter', dest='exporters', action='append',
+                        choices=sorted(EXPORTERS), help='Exporter to time, all if not set')
+    parser.add_argument('--scale', dest='scale', action='store',
+                        type=int, default=10, help='Size of the large school relative to the small one')
+    parser.add_argument('--out', dest='output_dir', action='store',
+                        required=True, help='Output directory for the generated files, for diffing')
+    parser.add_argument('--baseline', dest='baseline_revision', action='store',
+                        default=BASELINE_REVISION, help='git revision of the exporters to compare with')
+    return parser.parse_args()
+
+def _speedup(baseline: float, current: float) -> float:
+    return baseline / current if current else float('nan')
+
+def printTimings(exporter: str, scale: int, small: tuple, large: tuple):
+    print('{:30} {:>10} {:>10} {:>8} {:>10} {:>10} {:>8}'.format(
+        exporter, 'baseline', 'scale 1', 'speedup', 'baseline', 'scale {}'.format(scale), 'speedup'))
+    rows = [(name, small[0][name], small[1][name], large[0][name], large[1][name]) for name in small[1]]
+    rows.append(('total', sum(small[0].values()), sum(small[1].values()),
+                 sum(large[0].values()), sum(large[1].values())))
+    for name, smallBaseline, smallCurrent, largeBaseline, largeCurrent in rows:
+        print('{:30} {:10.3f} {:10.3f} {:7.1f}x {:10.3f} {:10.3f} {:7.1f}x'.format(
+            name, smallBaseline, smallCurrent, _speedup(smallBaseline, smallCurrent),
+            largeBaseline, largeCurrent, _speedup(largeBaseline, largeCurrent)))
+
+if __name__ == "__main__" :
+    args = parse_arguments()
+    with tempfile.TemporaryDirectory() as baseline_dir:
+        baseline_src = extractBaseline(args.baseline_revision, baseline_dir)
+        for exporter in args.exporters or sorted(EXPORTERS):
+            small = benchmark(exporter, 1, args.output_dir, baseline_src)
+            large = benchmark(exporter, args.scale, args.output_dir, baseline_src)
+            printTimings(exporter, args.scale, small, large)
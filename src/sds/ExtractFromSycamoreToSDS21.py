@@ -1,5 +1,6 @@
 import argparse
 from datetime import datetime
+import numpy
 import os
 import pandas
 # import re
@@ -10,110 +11,85 @@ import sys
 sys.path.append("..")
 sys.path.append(".")
 
+from lib import Frames
 from lib import Generators
 from lib import SycamoreRest
 from lib import SycamoreCache
+from lib import SycamoreOutput
+from lib import SycamoreViews
+from lib import Usernames
+from lib import Translations
 
 DATE_FORMAT = '%Y-%m-%d'
 
 class CleverCreator:
 
-    def __init__(self, args):
+    def __init__(self, args, sycamore: SycamoreCache.Cache = None, views: SycamoreViews.Views = None):
         self.school_id = args.school_id
         self.cache_dir = args.cache_dir
         self.output_dir = args.output_dir
+        self.delta = args.delta_output
+
+        if args.translations:
+            Translations.load(args.translations)
 
         if not os.path.exists(self.output_dir):
             os.mkdir(self.output_dir)
         elif not os.path.isdir(self.output_dir):
             raise InvalidOutputDir('output_dir="{}" is not a directory'.format(self.output_dir))
 
-        print('Initializing cache')
-        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token)
-        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data)
-
-    def generate(self):
+        if sycamore is None:
+            print('Initializing cache')
+            rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token,
+                                        rate=args.rate, burst=args.burst)
+            sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data,
+                                           refresh=args.refresh_data, resume=args.resume_load,
+                                           memory_map=args.memory_map or SycamoreCache.MEMORY_MAP_ENTITIES)
+        self.sycamore = sycamore
+        if views is None:
+            accounts = Usernames.loadAccounts(args.accounts) if args.accounts else None
+            views = SycamoreViews.Views(self.sycamore, accounts=accounts)
+        self.views = views
+
+    def generate(self, workers: int = SycamoreOutput.DEFAULT_WORKERS):
         print('Generating output')
-        schools = self.generateOrgs()
-        schools.to_csv(
-            os.path.join(self.output_dir, 'orgs.csv'),
-            index=False)
-
-        students = self.generateUsers()
-        students.to_csv(
-            os.path.join(self.output_dir, 'users.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        roles = self.generateRoles()
-        roles.to_csv(
-            os.path.join(self.output_dir, 'roles.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        classes = self.generateClasses()
-        classes.to_csv(
-            os.path.join(self.output_dir, 'classes.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        enrollments = self.generateEnrollments()
-        enrollments.to_csv(
-            os.path.join(self.output_dir, 'enrollments.csv'),
-            index=False)
-
-        academicSessions = self.generateAcademicSessions()
-        academicSessions.to_csv(
-            os.path.join(self.output_dir, 'academicSessions.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        courses = self.generateCourses()
-        courses.to_csv(
-            os.path.join(self.output_dir, 'courses.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        relationships = self.generateRelationships()
-        relationships.to_csv(
-            os.path.join(self.output_dir, 'relationships.csv'),
-            index=False)
+        if self.sycamore.cache_dir is not None:
+            Generators.loadPhoneNumberMemo(self.sycamore.cache_dir)
+        SycamoreOutput.generate_all([
+            SycamoreOutput.Output('orgs.csv', self.generateOrgs),
+            SycamoreOutput.Output('users.csv', self.generateUsers, date_format=DATE_FORMAT),
+            SycamoreOutput.Output('roles.csv', self.generateRoles, key=['userSourcedId', 'role'],
+                                  date_format=DATE_FORMAT),
+            SycamoreOutput.Output('classes.csv', self.generateClasses, date_format=DATE_FORMAT),
+            SycamoreOutput.StreamingOutput('enrollments.csv', self.iterEnrollments,
+                                           key=['classSourcedId', 'userSourcedId']),
+            SycamoreOutput.Output('academicSessions.csv', self.generateAcademicSessions, date_format=DATE_FORMAT),
+            SycamoreOutput.Output('courses.csv', self.generateCourses, date_format=DATE_FORMAT),
+            SycamoreOutput.StreamingOutput('relationships.csv', self.iterRelationships,
+                                           key=['userSourcedId', 'relationshipUserSourcedId']),
+            ], self.output_dir, workers=workers, delta=self.delta)
+        if self.sycamore.cache_dir is not None:
+            Generators.savePhoneNumberMemo(self.sycamore.cache_dir)
+        Translations.report()
 
     def _strToDate(self, dateStr: str) -> datetime.date:
         return datetime.strptime(dateStr, '%Y-%m-%d') if dateStr else None
 
-    def _isValidFamilyContact(self, sycFamilyContact) -> bool:
-        #if sycFamilyContact['PrimaryParent'] != 1:
-        #    return False
-
-        if not sycFamilyContact['Email']:
-            return False
-
-        if not sycFamilyContact['FirstName']:
-            return False
-
-        if not sycFamilyContact['LastName']:
-            return False
-
-        return True
-
-    def _appendFamilyContactUser(self, contactId, sycFamilyContact, phoneField=None):
-        if phoneField and not sycFamilyContact[phoneField]:
-            return None
-
-        sdsUser = {}
-        sdsUser['sourcedId'] = contactId
-        sdsUser['username'] = sycFamilyContact['Email']
-        sdsUser['familyName'] = sycFamilyContact['LastName'].strip()
-        sdsUser['givenName'] = sycFamilyContact['FirstName'].strip()
-        sdsUser['email'] = sycFamilyContact['Email']
-        if phoneField:
-            sdsUser['phone'] = Generators.createE164PhoneNumber(sycFamilyContact[phoneField], sycamore_contact_id=contactId)
-
-        return sdsUser
+    def _familyContactPhones(self, sycFamilyContacts: pandas.DataFrame) -> list:
+        # Try cell phone first, then work phone, then home phone and finally no phone number
+        phoneFields = ['CellPhone', 'WorkPhone', 'HomePhone']
+        hasPhone = [Frames.truthy(sycFamilyContacts[field]).to_numpy() for field in phoneFields]
+        phones = numpy.select(hasPhone,
+                              [sycFamilyContacts[field].to_numpy(dtype=object) for field in phoneFields],
+                              default=None)
+        found = numpy.logical_or.reduce(hasPhone)
+        e164Phones = pandas.Series(None, index=range(len(phones)), dtype=object)
+        e164Phones[found] = Generators.createE164PhoneNumbers(
+            pandas.Series(phones[found], dtype=object), sycFamilyContacts.index[found]).to_numpy()
+        return list(e164Phones)
 
     def generateUsers(self):
-        sdsUsers = pandas.DataFrame(columns=[
+        columns = [
             'sourcedId',
             'username',
             'familyName',
@@ -123,82 +99,59 @@ class CleverCreator:
             'phone',
             'sms',
             'userNumber',
-            ])
+            ]
 
         # Add family contacts
-        for index, sycFamilyContact in self.sycamore.get('family_contacts').iterrows():
-            # Email, First Name and Last Name are required in SDS, so skip contacts without it
-            if (not self._isValidFamilyContact(sycFamilyContact)):
-                continue
-
-            # Try cell phone first, then work phone, then home phone and finally no phone number
-            sdsUser = self._appendFamilyContactUser(index, sycFamilyContact, 'CellPhone')
-            if not sdsUser:
-                sdsUser = self._appendFamilyContactUser(index, sycFamilyContact, 'WorkPhone')
-            if not sdsUser:
-                sdsUser = self._appendFamilyContactUser(index, sycFamilyContact, 'HomePhone')
-            if not sdsUser:
-                sdsUser = self._appendFamilyContactUser(index, sycFamilyContact)
-
-            if not sdsUser:
-                print('Could not generate user for family contact {}'.format(index))
-            sdsUsers.loc[str(index)] = pandas.Series(data=sdsUser)
+        # Email, First Name and Last Name are required in SDS, so skip contacts without it
+        sycFamilyContacts = self.views.validFamilyContacts()
+        contacts = pandas.DataFrame({
+            'sourcedId': sycFamilyContacts.index,
+            'username': sycFamilyContacts['Email'].to_numpy(),
+            'familyName': sycFamilyContacts['LastName'].str.strip().to_numpy(),
+            'givenName': sycFamilyContacts['FirstName'].str.strip().to_numpy(),
+            'email': sycFamilyContacts['Email'].to_numpy(),
+            'phone': self._familyContactPhones(sycFamilyContacts),
+            })
 
         # Add students
-        for index, _sycStudent in self.sycamore.get('students').iterrows():
-            sycStudentDetails = self.sycamore.get('student_details').loc[index]
-
-            if sycStudentDetails['Grade'] is None:
-                print('Skipping student "{}" with empty grade'.format(index))
-                continue
-
-            emailAddress = Generators.createStudentEmailAddress(
-                sycStudentDetails['FirstName'], sycStudentDetails['LastName'],
-                include_domain=True)
-
-            sdsUser = {}
-            sdsUser['sourcedId'] = index
-            sdsUser['username'] = emailAddress
-            sdsUser['familyName'] = sycStudentDetails['LastName']
-            sdsUser['givenName'] = sycStudentDetails['FirstName']
-            sdsUser['activeDirectoryMatchId'] = emailAddress
-            sdsUser['email'] = emailAddress
-            sdsUser['phone'] = None
-            sdsUser['sms'] = None
-            sdsUser['userNumber'] = index
-
-            sdsUsers.loc[index] = pandas.Series(data=sdsUser)
-
+        sycStudentDetails = self.views.studentDetails()
+        emailAddresses = self.views.studentEmails(include_domain=True).to_numpy()
+        students = pandas.DataFrame({
+            'sourcedId': sycStudentDetails.index,
+            'username': emailAddresses,
+            'familyName': sycStudentDetails['LastName'].to_numpy(),
+            'givenName': sycStudentDetails['FirstName'].to_numpy(),
+            'activeDirectoryMatchId': emailAddresses,
+            'email': emailAddresses,
+            'phone': None,
+            'sms': None,
+            'userNumber': sycStudentDetails.index,
+            })
 
         # Add teachers
-        for index, sycEmployee in self.sycamore.get('employees').iterrows():
-            if sycEmployee['Position'] != 'Teacher' and sycEmployee['Position'] != 'Substitute':
-                continue
-            if sycEmployee['Active'] != 1:
-                continue
-            if sycEmployee['Current'] != 1:
-                continue
-
-            sdsUser = {}
-            sdsUser['sourcedId'] = index
-            emailAddress = Generators.createTeacherEmailAddress(
-                sycEmployee['FirstName'], sycEmployee['LastName'], sycEmployee['Email1'],
-                include_domain=True)
-            sdsUser['username'] = emailAddress
-            sdsUser['familyName'] = sycEmployee['LastName']
-            sdsUser['givenName'] = sycEmployee['FirstName']
-            sdsUser['activeDirectoryMatchId'] = emailAddress
-            sdsUser['email'] = emailAddress
-            sdsUser['phone'] = None
-            sdsUser['sms'] = None
-            sdsUser['userNumber'] = index
-
-            sdsUsers.loc[index] = pandas.Series(data=sdsUser)
-
+        sycTeachers = self.views.teachers()
+        emailAddresses = self.views.teacherEmails(include_domain=True).to_numpy()
+        teachers = pandas.DataFrame({
+            'sourcedId': sycTeachers.index,
+            'username': emailAddresses,
+            'familyName': sycTeachers['LastName'].to_numpy(),
+            'givenName': sycTeachers['FirstName'].to_numpy(),
+            'activeDirectoryMatchId': emailAddresses,
+            'email': emailAddresses,
+            'phone': None,
+            'sms': None,
+            'userNumber': sycTeachers.index,
+            })
+
+        sdsUsers = Frames.upsert([
+            ([str(index) for index in sycFamilyContacts.index], contacts),
+            (sycStudentDetails.index, students),
+            (sycTeachers.index, teachers),
+            ], columns)
         return sdsUsers.drop_duplicates()
 
     def generateRoles(self):
-        sdsRoles = pandas.DataFrame(columns=[
+        columns = [
             'userSourcedId',
             'orgSourcedId',
             'role',
@@ -207,129 +160,99 @@ class CleverCreator:
             'isPrimary',
             'roleStartDate',
             'roleEndDate',
-            ])
+            ]
 
         # Add students
-        for index, _sycStudent in self.sycamore.get('students').iterrows():
-            sycStudentDetails = self.sycamore.get('student_details').loc[index]
-
-            if sycStudentDetails['Grade'] is None:
-                print('Skipping student "{}" with empty grade'.format(index))
-                continue
-
-            emailAddress = Generators.createStudentEmailAddress(
-                sycStudentDetails['FirstName'], sycStudentDetails['LastName'],
-                include_domain=True)
-
-            sdsRole = {}
-            sdsRole['userSourcedId'] = index
-            sdsRole['orgSourcedId'] = self.school_id
-            sdsRole['role'] = 'student'
-
-            sdsRoles.loc[index] = pandas.Series(data=sdsRole)
-
+        sycStudentDetails = self.views.studentDetails()
+        students = pandas.DataFrame({
+            'userSourcedId': sycStudentDetails.index,
+            'orgSourcedId': self.school_id,
+            'role': 'student',
+            })
 
         # Add teachers
-        for index, sycEmployee in self.sycamore.get('employees').iterrows():
-            if sycEmployee['Position'] != 'Teacher' and sycEmployee['Position'] != 'Substitute':
-                continue
-            if sycEmployee['Active'] != 1:
-                continue
-            if sycEmployee['Current'] != 1:
-                continue
-
-            sdsRole = {}
-            sdsRole['userSourcedId'] = index
-            sdsRole['orgSourcedId'] = self.school_id
-            sdsRole['role'] = Generators.createUserRole(sycamore_employee_position=sycEmployee['Position'],
-                                                        sycamore_employee_id=index)
-
-            sdsRoles.loc[index] = pandas.Series(data=sdsRole)
-
+        sycTeachers = self.views.teachers()
+        teachers = pandas.DataFrame({
+            'userSourcedId': sycTeachers.index,
+            'orgSourcedId': self.school_id,
+            'role': Translations.translateSeries('user_role', sycTeachers['Position']).to_numpy(),
+            })
+
+        sdsRoles = Frames.upsert([
+            (sycStudentDetails.index, students),
+            (sycTeachers.index, teachers),
+            ], columns)
         return sdsRoles.drop_duplicates()
 
-    def _getCurrentYear(self):
-        for index, year in self.sycamore.get('years').iterrows():
-            if year['Current'] == '1':
-                return self.sycamore.get('years_details').loc[index]
-        return None
-
     def generateClasses(self):
-        currentYear = self._getCurrentYear()
+        currentYear = self.views.currentYear()
 
-        sdsClasses = pandas.DataFrame(columns=[
+        columns = [
             'sourcedId',
             'orgSourcedId',
             'title',
             'sessionSourcedIds',
             'courseSourcedId',
             'code',
-            ])
+            ]
 
-        for index, sycClass in self.sycamore.get('classes').iterrows():
-            sdsClass = {}
-            sdsClass['sourcedId'] = index
-            sdsClass['orgSourcedId'] = self.school_id
-            sdsClass['title'] = Generators.createSectionName(
-                sycClass['Name'], sycClass['Section'])
-            sdsClass['sessionSourcedIds'] = currentYear['Name']
-            sdsClass['courseSourcedId'] = index
-            sdsClass['code'] = index
+        sycClasses = self.sycamore.get('classes')
+        classes = pandas.DataFrame({
+            'sourcedId': sycClasses.index,
+            'orgSourcedId': self.school_id,
+            'title': [Generators.createSectionName(name, section)
+                      for name, section in zip(sycClasses['Name'], sycClasses['Section'])],
+            'sessionSourcedIds': currentYear['Name'],
+            'courseSourcedId': sycClasses.index,
+            'code': sycClasses.index,
+            })
 
-            sdsClasses.loc[index] = pandas.Series(data=sdsClass)
+        return Frames.upsert([(sycClasses.index, classes)], columns)
 
-        return sdsClasses
 
-
-    def generateEnrollments(self):
-        sdsEnrollments = pandas.DataFrame(columns=[
+    def iterEnrollments(self, batch_size: int = SycamoreOutput.BATCH_SIZE):
+        columns = [
             'classSourcedId',
             'userSourcedId',
             'role',
-            ])
-
-        # Add Students
-        for index, _sycStudent in self.sycamore.get('students').iterrows():
-            try:
-                sycStudentClassesList = self.sycamore.get('student_classes')
-                sycStudentClasses = sycStudentClassesList.loc[sycStudentClassesList['students_id'] == index]
-            except KeyError:
-                print('Skipping student "{} {}" with no classes'.format(_sycStudent["FirstName"], _sycStudent["LastName"]))
-                continue
-
-            if sycStudentClasses is None:
-                print('Skipping student "{} {}" with empty classes'.format(_sycStudent["FirstName"], _sycStudent["LastName"]))
-                continue
-
-            for studentClassIndex, sycStudentClass in sycStudentClasses.iterrows():
-                studentStudentClassIndex = '{}_{}'.format(index, studentClassIndex)
-                sdsEnrollment = {}
-                sdsEnrollment['classSourcedId'] = studentClassIndex
-                sdsEnrollment['userSourcedId'] = index
-                sdsEnrollment['role'] = 'student'
-
-                sdsEnrollments.loc[studentStudentClassIndex] = pandas.Series(data=sdsEnrollment)
+            ]
+
+        # Add Students, in the order of 'students'. The keys are unique, so
+        # every batch only needs the classes of its own students.
+        sycStudents = self.sycamore.get('students')
+        for studentIds in Frames.chunks(sycStudents.index, batch_size):
+            sycBatch = self.sycamore.childrenOf('student_classes', studentIds)
+            students = pandas.DataFrame({
+                'classSourcedId': sycBatch.index,
+                'userSourcedId': sycBatch['students_id'].to_numpy(),
+                'role': 'student',
+                })
+            studentKeys = ['{}_{}'.format(studentIndex, studentClassIndex)
+                           for studentIndex, studentClassIndex in zip(sycBatch['students_id'], sycBatch.index)]
+            yield Frames.upsert([(studentKeys, students)], columns)
 
         # Add teacher for each class
-        for index, sycClass in self.sycamore.get('classes').iterrows():
-            teacherId = Generators.createTeacherId(sycClass['PrimaryStaffID'])
+        sycClasses = self.sycamore.get('classes')
+        teacherIds = [Generators.createTeacherId(staffId) for staffId in sycClasses['PrimaryStaffID']]
+        for index, teacherId in zip(sycClasses.index, teacherIds):
             if not teacherId:
                 print('WARNING: Class {} does not have a teacher assigned.'.format(index))
-                continue
-
-            teacherClassIndex = '{}_{}'.format(teacherId, index)
-            sdsEnrollment = {}
-            sdsEnrollment['classSourcedId'] = index
-            sdsEnrollment['userSourcedId'] = teacherId
-            sdsEnrollment['role'] = Generators.createUserRole(sycamore_employee_position='Teacher',
-                                                        sycamore_employee_id=teacherId)
+        hasTeacher = numpy.array([bool(teacherId) for teacherId in teacherIds], dtype=bool)
+        classIds = sycClasses.index[hasTeacher]
+        teacherIds = [teacherId for teacherId in teacherIds if teacherId]
+        teachers = pandas.DataFrame({
+            'classSourcedId': classIds,
+            'userSourcedId': pandas.Series(teacherIds, dtype=object).to_numpy(),
+            'role': Generators.createUserRole(sycamore_employee_position='Teacher', sycamore_employee_id=None),
+            })
+        teacherKeys = ['{}_{}'.format(teacherId, index) for teacherId, index in zip(teacherIds, classIds)]
+        yield Frames.upsert([(teacherKeys, teachers)], columns)
 
-            sdsEnrollments.loc[teacherClassIndex] = pandas.Series(data=sdsEnrollment)
-
-        return sdsEnrollments.drop_duplicates()
+    def generateEnrollments(self):
+        return SycamoreOutput.collect(self.iterEnrollments())
 
     def generateAcademicSessions(self):
-        currentYear = self._getCurrentYear()
+        currentYear = self.views.currentYear()
 
         sdsAcademicSessions = pandas.DataFrame(columns=[
             'sourcedId',
@@ -361,9 +284,9 @@ class CleverCreator:
 
 
     def generateCourses(self):
-        currentYear = self._getCurrentYear()
+        currentYear = self.views.currentYear()
 
-        sdsCourses = pandas.DataFrame(columns=[
+        columns = [
             'sourcedId',
             'orgSourcedId',
             'title',
@@ -371,51 +294,59 @@ class CleverCreator:
             'schoolYearSourcedId',
             'subject',
             'grade',
-            ])
+            ]
 
-        for index, sycClass in self.sycamore.get('classes').iterrows():
-            sdsCourse = {}
-            sdsCourse['sourcedId'] = index
-            sdsCourse['orgSourcedId'] = self.school_id
-            sdsCourse['title'] = sycClass['Name']
-            sdsCourse['code'] = index
-            sdsCourse['schoolYearSourcedId'] = currentYear['Name']
-            sdsCourse['subject'] = '24039' # "World language"
-            sdsCourse['grade'] = None
+        sycClasses = self.sycamore.get('classes')
+        courses = pandas.DataFrame({
+            'sourcedId': sycClasses.index,
+            'orgSourcedId': self.school_id,
+            'title': sycClasses['Name'].to_numpy(),
+            'code': sycClasses.index,
+            'schoolYearSourcedId': currentYear['Name'],
+            'subject': '24039', # "World language"
+            'grade': None,
+            })
 
-            sdsCourses.loc[index] = pandas.Series(data=sdsCourse)
+        return Frames.upsert([(sycClasses.index, courses)], columns)
 
-        return sdsCourses
 
-
-    def generateRelationships(self):
-        sdsRelationships = pandas.DataFrame(columns=[
+    def iterRelationships(self, batch_size: int = SycamoreOutput.BATCH_SIZE):
+        columns = [
             'userSourcedId', # the student
             'relationshipUserSourcedId',
             'relationshipRole',
-            ])
+            ]
+
+        # Every valid contact of a family is related to every student of the
+        # family, in the order of 'families', then contacts, then students.
+        familyIds = self.sycamore.get('families').index
+        for batchIds in Frames.chunks(familyIds, batch_size):
+            # Email is the lookup key, so skip contacts without it
+            sycContacts = SycamoreViews.validContacts(self.sycamore.childrenOf('family_contacts', batchIds))
+            sycStudents = self.sycamore.childrenOf('family_students', batchIds)
+            contacts = pandas.DataFrame({
+                'familyId': sycContacts['families_id'].to_numpy(),
+                'contactId': sycContacts.index,
+                'relation': sycContacts['Relation'].to_numpy(),
+                'contactOrder': numpy.arange(len(sycContacts.index)),
+                })
+            students = pandas.DataFrame({
+                'familyId': sycStudents['families_id'].to_numpy(),
+                'studentId': sycStudents.index,
+                'studentOrder': numpy.arange(len(sycStudents.index)),
+                })
+            pairs = contacts.merge(students, on='familyId').sort_values(by=['contactOrder', 'studentOrder'])
+
+            relationships = pandas.DataFrame({
+                'userSourcedId': pairs['studentId'].to_numpy(),
+                'relationshipUserSourcedId': pairs['contactId'].to_numpy(),
+                'relationshipRole': Translations.translateSeries('relationship_role', pairs['relation']).to_numpy(),
+                })
+            keys = [str(studentId) + "_" + str(contactId) for studentId, contactId in zip(pairs['studentId'], pairs['contactId'])]
+            yield Frames.upsert([(keys, relationships)], columns)
 
-        sycFamilyContacts = self.sycamore.get('family_contacts')
-        sycFamilyStudents = self.sycamore.get('family_students')
-
-        for familyIndex, sycFamily in self.sycamore.get('families').iterrows():
-            for contactIndex, sycFamilyContact in sycFamilyContacts.loc[sycFamilyContacts['families_id'] == familyIndex].iterrows():
-                # Email is the lookup key, so skip contacts without it
-                if not self._isValidFamilyContact(sycFamilyContact):
-                    continue
-
-                for studentIndex in sycFamilyStudents.loc[sycFamilyStudents['families_id'] == familyIndex].index.values:
-                    sdsRelationship = {}
-                    sdsRelationship['userSourcedId'] = studentIndex
-                    sdsRelationship['relationshipUserSourcedId'] = contactIndex
-                    sdsRelationship['relationshipRole'] = Generators.createRelationshipRole(
-                        sycamore_relationship=sycFamilyContact['Relation'],
-                        sycamore_contact_id=contactIndex)
-
-                    sdsRelationships.loc[str(studentIndex)+"_"+str(contactIndex)] = (
-                        pandas.Series(data=sdsRelationship))
-
-        return sdsRelationships.drop_duplicates()
+    def generateRelationships(self):
+        return SycamoreOutput.collect(self.iterRelationships())
 
     def _getSchool(self) -> pandas.core.series.Series:
         sycSchools = self.sycamore.get('school')
@@ -455,9 +386,35 @@ def parse_arguments():
                         required=True, help='Cache directory')
     parser.add_argument('--reload', dest='reload_data', action='store_true',
                         help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
+    parser.add_argument('--memory-map', dest='memory_map', action='append', metavar='ENTITY',
+                        choices=[entity.name for entity in SycamoreCache.ENTITIES],
+                        help='Entity to memory-map when loading the cache from Arrow files, can be repeated '
+                             '(default: {})'.format(', '.join(SycamoreCache.MEMORY_MAP_ENTITIES)))
+    parser.add_argument('--memory-report', dest='memory_report', action='store_true',
+                        help='Whether to print the memory used by each loaded entity')
     parser.add_argument('--out', dest='output_dir', action='store',
                         required=True, help='Output directory')
+    parser.add_argument('--accounts', dest='accounts', action='store',
+                        help='CSV file with the Username and ID of existing accounts')
+    parser.add_argument('--delta', dest='delta_output', action='store_true',
+                        help='Whether to also write the changes since the last delta run, and skip unchanged files')
+    parser.add_argument('--translations', dest='translations', action='store',
+                        help='JSON file with additional grade, term and relationship translations')
     parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
+    parser.set_defaults(memory_report=False)
+    parser.set_defaults(delta_output=False)
     return parser.parse_args()
 
 if __name__ == "__main__" :
@@ -465,5 +422,7 @@ if __name__ == "__main__" :
     args = parse_arguments()
     creator = CleverCreator(args)
     creator.generate()
+    if args.memory_report:
+        creator.sycamore.printMemoryReport()
     print('Done')
 
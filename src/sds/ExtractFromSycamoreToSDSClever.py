@@ -1,5 +1,6 @@
 import argparse
 from datetime import datetime
+import numpy
 import os
 import pandas
 # import re
@@ -10,73 +11,82 @@ import sys
 sys.path.append("..")
 sys.path.append(".")
 
+from lib import Frames
 from lib import Generators
 from lib import SycamoreRest
 from lib import SycamoreCache
+from lib import SycamoreOutput
+from lib import SycamoreViews
+from lib import Usernames
+from lib import Translations
 
 DATE_FORMAT = '%m/%d/%Y'
 
 class CleverCreator:
 
-    def __init__(self, args):
+    def __init__(self, args, sycamore: SycamoreCache.Cache = None, views: SycamoreViews.Views = None):
         self.school_id = args.school_id
         self.cache_dir = args.cache_dir
         self.output_dir = args.output_dir
+        self.delta = args.delta_output
+
+        if args.translations:
+            Translations.load(args.translations)
 
         if not os.path.exists(self.output_dir):
             os.mkdir(self.output_dir)
         elif not os.path.isdir(self.output_dir):
             raise InvalidOutputDir('output_dir="{}" is not a directory'.format(self.output_dir))
 
-        print('Initializing cache')
-        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token)
-        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data)
-
-    def generate(self):
+        if sycamore is None:
+            print('Initializing cache')
+            rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token,
+                                        rate=args.rate, burst=args.burst)
+            sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data,
+                                           refresh=args.refresh_data, resume=args.resume_load,
+                                           memory_map=args.memory_map or SycamoreCache.MEMORY_MAP_ENTITIES)
+        self.sycamore = sycamore
+        if views is None:
+            accounts = Usernames.loadAccounts(args.accounts) if args.accounts else None
+            views = SycamoreViews.Views(self.sycamore, accounts=accounts)
+        self.views = views
+
+    def generate(self, workers: int = SycamoreOutput.DEFAULT_WORKERS):
         print('Generating output')
-        schools = self.generateSchools()
-        schools.to_csv(
-            os.path.join(self.output_dir, 'schools.csv'),
-            index=False)
-
-        students = self.generateStudents()
-        students.sort_index(axis='index').to_csv(
-            os.path.join(self.output_dir, 'students.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        sections = self.generateSections()
-        sections.to_csv(
-            os.path.join(self.output_dir, 'sections.csv'),
-            index=False,
-            date_format=DATE_FORMAT)
-
-        teachers = self.generateTeachers()
-        teachers.sort_index(axis='index').to_csv(
-            os.path.join(self.output_dir, 'teachers.csv'),
-            index=False)
-
-        enrollments = self.generateEnrollments()
-        enrollments.sort_values(
-            by=['School_id', 'Section_id', 'Student_id']).to_csv(
-            os.path.join(self.output_dir, 'enrollments.csv'),
-            index=False)
-
-        users = self.generateUsers()
-        users.sort_values(by=['SIS ID','Phone']).to_csv(
-            os.path.join(self.output_dir, 'user.csv'),
-            index=False)
-
-        guardianRelationships = self.generateGuardianRelationships()
-        guardianRelationships.sort_values(by=['SIS ID', 'Email']).to_csv(
-            os.path.join(self.output_dir, 'guardianrelationship.csv'),
-            index=False)
+        SycamoreOutput.generate_all([
+            SycamoreOutput.Output('schools.csv', self.generateSchools),
+            SycamoreOutput.Output(
+                'students.csv', lambda: self.generateStudents().sort_index(axis='index'),
+                date_format=DATE_FORMAT),
+            SycamoreOutput.Output('sections.csv', self.generateSections, date_format=DATE_FORMAT),
+            SycamoreOutput.Output('teachers.csv', lambda: self.generateTeachers().sort_index(axis='index')),
+            SycamoreOutput.Output(
+                'enrollments.csv',
+                lambda: self.generateEnrollments().sort_values(by=['School_id', 'Section_id', 'Student_id']),
+                key=['Section_id', 'Student_id']),
+            SycamoreOutput.Output(
+                'user.csv', lambda: self.generateUsers().sort_values(by=['SIS ID', 'Phone']),
+                key=['SIS ID', 'Phone']),
+            SycamoreOutput.Output(
+                'guardianrelationship.csv',
+                lambda: self.generateGuardianRelationships().sort_values(by=['SIS ID', 'Email']),
+                key=['SIS ID', 'Email']),
+            ], self.output_dir, workers=workers, delta=self.delta)
+        Translations.report()
 
     def _strToDate(self, dateStr: str) -> datetime.date:
         return datetime.strptime(dateStr, '%Y-%m-%d') if dateStr else None
 
+    def _dateToStr(self, date: datetime.date) -> str:
+        return date.strftime(DATE_FORMAT) if date else ''
+
+    def _primaryContacts(self) -> pandas.DataFrame:
+        # Primary contacts with an e-mail address
+        sycPrimaryContacts = self.views.primaryContacts()
+        return sycPrimaryContacts.loc[Frames.truthy(sycPrimaryContacts['Email']).to_numpy()]
+
     def generateStudents(self):
-        cleverStudents = pandas.DataFrame(columns=[
+        columns = [
             'Student_id',
             'School_id',
             'Username',
@@ -90,46 +100,32 @@ class CleverCreator:
             'Middle_name',
             'Status',
             'Password',
-            ])
-
-        for index, _sycStudent in self.sycamore.get('students').iterrows():
-            sycStudentDetails = self.sycamore.get('student_details').loc[index]
-
-            if sycStudentDetails['Grade'] is None:
-                print('Skipping student "{}" with empty grade'.format(index))
-                continue
-
-            cleverStudent = {}
-            cleverStudent['Student_id'] = index
-            cleverStudent['School_id'] = self.school_id
-            cleverStudent['Username'] = Generators.createStudentEmailAddress(
-                sycStudentDetails['FirstName'], sycStudentDetails['LastName'],
-                include_domain=False)
-            cleverStudent['Student_number'] = sycStudentDetails['ExtID']
-            cleverStudent['Dob'] = self._strToDate(sycStudentDetails['DOB'])
-            cleverStudent['Grade'] = Generators.createGrade(sycStudentDetails['Grade'])
-            cleverStudent['State_id'] = sycStudentDetails['StateID']
-            cleverStudent['Secondary_email'] = sycStudentDetails['Email']
-            cleverStudent['First_name'] = sycStudentDetails['FirstName']
-            cleverStudent['Last_name'] = sycStudentDetails['LastName']
-            cleverStudent['Middle_name'] = ''  # TODO(osenft): Find data
-            cleverStudent['Status'] = ''  # TODO(osenft): Find data
-            cleverStudent['Password'] = sycStudentDetails['Code']
-
-            cleverStudents.loc[index] = pandas.Series(data=cleverStudent)
-
-        return cleverStudents
-
-    def _getCurrentYear(self):
-        for index, year in self.sycamore.get('years').iterrows():
-            if year['Current'] == '1':
-                return self.sycamore.get('years_details').loc[index]
-        return None
+            ]
+
+        sycStudentDetails = self.views.studentDetails()
+        cleverStudents = pandas.DataFrame({
+            'Student_id': sycStudentDetails.index,
+            'School_id': self.school_id,
+            'Username': self.views.studentEmails(include_domain=False).to_numpy(),
+            'Student_number': sycStudentDetails['ExtID'].to_numpy(),
+            # Formatted here, as date_format only applies to datetime64 columns.
+            'Dob': [self._dateToStr(self._strToDate(dob)) for dob in sycStudentDetails['DOB']],
+            'Grade': Translations.translateSeries('grade', sycStudentDetails['Grade']).to_numpy(),
+            'State_id': sycStudentDetails['StateID'].to_numpy(),
+            'Secondary_email': sycStudentDetails['Email'].to_numpy(),
+            'First_name': sycStudentDetails['FirstName'].to_numpy(),
+            'Last_name': sycStudentDetails['LastName'].to_numpy(),
+            'Middle_name': '',  # TODO(osenft): Find data
+            'Status': '',  # TODO(osenft): Find data
+            'Password': sycStudentDetails['Code'].to_numpy(),
+            })
+
+        return Frames.upsert([(sycStudentDetails.index, cleverStudents)], columns)
 
     def generateSections(self):
-        currentYear = self._getCurrentYear()
+        currentYear = self.views.currentYear()
 
-        cleverSections = pandas.DataFrame(columns=[
+        columns = [
             'Section_id',
             'School_id',
             'Teacher_id',
@@ -141,42 +137,37 @@ class CleverCreator:
             'Subject',
             'Period',
             'Status',
-            ])
-
-        for index, sycClass in self.sycamore.get('classes').iterrows():
-            cleverSection = {}
-            cleverSection['Section_id'] = index
-            cleverSection['School_id'] = self.school_id
-            cleverSection['Teacher_id'] = Generators.createTeacherId(sycClass['PrimaryStaffID'])
-            cleverSection['Name'] = Generators.createSectionName(
-                sycClass['Name'], sycClass['Section'])
-
-            cleverSection['Term_name'] = Generators.createTermName(sycClass['TermLength'])
-            term_start_date = Generators.createTermStart(
-                sycClass['TermLength'],
-                self._strToDate(currentYear['Q1.StartDate']),
-                self._strToDate(currentYear['Q3.StartDate']),
-                self._strToDate(currentYear['EndDate']))
-            cleverSection['Term_start'] = term_start_date.strftime(DATE_FORMAT) if term_start_date else ''
-            term_start_end = Generators.createTermEnd(
-                sycClass['TermLength'],
-                self._strToDate(currentYear['Q1.StartDate']),
-                self._strToDate(currentYear['Q3.StartDate']),
-                self._strToDate(currentYear['EndDate']))
-            cleverSection['Term_end'] = term_start_end.strftime(DATE_FORMAT) if term_start_end else ''
-
-            cleverSection['Course_name'] = sycClass['Name']
-            cleverSection['Subject'] = 'Language'
-            cleverSection['Period'] = Generators.createPeriod(sycClass['Name'])
-            cleverSection['Status'] = 'Active'
-
-            cleverSections.loc[index] = pandas.Series(data=cleverSection)
-
-        return cleverSections
+            ]
+
+        s1Start = self._strToDate(currentYear['Q1.StartDate'])
+        s2Start = self._strToDate(currentYear['Q3.StartDate'])
+        yearEnd = self._strToDate(currentYear['EndDate'])
+
+        sycClasses = self.sycamore.get('classes')
+        termStarts = [Generators.createTermStart(termLength, s1Start, s2Start, yearEnd)
+                      for termLength in sycClasses['TermLength']]
+        termEnds = [Generators.createTermEnd(termLength, s1Start, s2Start, yearEnd)
+                    for termLength in sycClasses['TermLength']]
+        cleverSections = pandas.DataFrame({
+            'Section_id': sycClasses.index,
+            'School_id': self.school_id,
+            'Teacher_id': [Generators.createTeacherId(staffId) for staffId in sycClasses['PrimaryStaffID']],
+            'Name': [Generators.createSectionName(name, section)
+                     for name, section in zip(sycClasses['Name'], sycClasses['Section'])],
+            'Term_name': Translations.translateSeries('term', sycClasses['TermLength']).to_numpy(),
+            'Term_start': [termStart.strftime(DATE_FORMAT) if termStart else '' for termStart in termStarts],
+            'Term_end': [termEnd.strftime(DATE_FORMAT) if termEnd else '' for termEnd in termEnds],
+            'Course_name': sycClasses['Name'].to_numpy(),
+            'Subject': 'Language',
+            'Period': Translations.translateSeries('period', sycClasses['Name']).to_numpy(),
+            'Status': 'Active',
+            })
+
+        return Frames.upsert([(sycClasses.index, cleverSections)], columns)
 
 
     def generateTeachers(self):
-        cleverTeachers = pandas.DataFrame(columns=[
+        columns = [
             'Teacher_id',
             'School_id',
             'Teacher_email',
@@ -185,126 +176,120 @@ class CleverCreator:
             'Last_name',
             'First_name',
             'Password',
-            ])
-
-        for index, sycEmployee in self.sycamore.get('employees').iterrows():
-            if sycEmployee['Position'] != 'Teacher' and sycEmployee['Position'] != 'Substitute':
-                continue
-            if sycEmployee['Active'] != 1:
-                continue
-            if sycEmployee['Current'] != 1:
-                continue
-
-            cleverTeacher = {}
-            cleverTeacher['Teacher_id'] = index
-            cleverTeacher['School_id'] = self.school_id
-            emailAddress = Generators.createTeacherEmailAddress(
-                sycEmployee['FirstName'], sycEmployee['LastName'], sycEmployee['Email1'],
-                include_domain=False)
-            cleverTeacher['Teacher_email'] = emailAddress
-            cleverTeacher['Username'] = emailAddress
-            cleverTeacher['Title'] = sycEmployee['Position']
-            cleverTeacher['Last_name'] = sycEmployee['LastName']
-            cleverTeacher['First_name'] = sycEmployee['FirstName']
-            cleverTeacher['Password'] = 'GS5Brul3s!'
-
-            cleverTeachers.loc[index] = pandas.Series(data=cleverTeacher)
-
-        return cleverTeachers
+            ]
+
+        sycTeachers = self.views.teachers()
+        emailAddresses = self.views.teacherEmails(include_domain=False).to_numpy()
+        cleverTeachers = pandas.DataFrame({
+            'Teacher_id': sycTeachers.index,
+            'School_id': self.school_id,
+            'Teacher_email': emailAddresses,
+            'Username': emailAddresses,
+            'Title': sycTeachers['Position'].to_numpy(),
+            'Last_name': sycTeachers['LastName'].to_numpy(),
+            'First_name': sycTeachers['FirstName'].to_numpy(),
+            'Password': 'GS5Brul3s!',
+            })
+
+        return Frames.upsert([(sycTeachers.index, cleverTeachers)], columns)
 
     def generateEnrollments(self):
-        cleverEnrollments = pandas.DataFrame(columns=[
+        columns = [
             'School_id',
             'Section_id',
             'Student_id',
-            ])
-
-        for index, _sycStudent in self.sycamore.get('students').iterrows():
-            try:
-                sycStudentClassesList = self.sycamore.get('student_classes')
-                sycStudentClasses = sycStudentClassesList.loc[sycStudentClassesList['students_id'] == index]
-            except KeyError:
-                print('Skipping student "{} {}" with no classes'.format(_sycStudent["FirstName"], _sycStudent["LastName"]))
-                continue
-
-            if sycStudentClasses is None:
-                print('Skipping student "{} {}" with empty classes'.format(_sycStudent["FirstName"], _sycStudent["LastName"]))
-                continue
-
-            for studentClassIndex, sycStudentClass in sycStudentClasses.iterrows():
-                studentStudentClassIndex = '{}_{}'.format(index, studentClassIndex)
-                cleverEnrollment = {}
-                cleverEnrollment['School_id'] = self.school_id
-                cleverEnrollment['Section_id'] = studentClassIndex
-                cleverEnrollment['Student_id'] = index
+            ]
 
-                cleverEnrollments.loc[studentStudentClassIndex] = pandas.Series(data=cleverEnrollment)
-
-        return cleverEnrollments
-
-    def _appendUser(self, sdsUsers, contactId, sycFamilyContact, phoneField):
-        if sycFamilyContact[phoneField]:
-            sdsUser = {}
-            sdsUser['Email'] = sycFamilyContact['Email']
-            sdsUser['First Name'] = sycFamilyContact['FirstName'].strip()
-            sdsUser['Last Name'] = sycFamilyContact['LastName'].strip()
-            sdsUser['Phone'] = Generators.createPhoneNumber(sycFamilyContact[phoneField])
-            sdsUser['SIS ID'] = contactId
-
-            sdsUsers.loc[str(contactId)+"_"+phoneField] = pandas.Series(data=sdsUser)
-
-        return sdsUsers
+        # All classes of all students, in the order of 'students'
+        sycStudentClasses = Frames.orderBy(
+            self.sycamore.get('student_classes'), 'students_id', self.sycamore.get('students').index)
+        cleverEnrollments = pandas.DataFrame({
+            'School_id': self.school_id,
+            'Section_id': sycStudentClasses.index,
+            'Student_id': sycStudentClasses['students_id'].to_numpy(),
+            })
+        keys = ['{}_{}'.format(studentIndex, studentClassIndex)
+                for studentIndex, studentClassIndex in zip(sycStudentClasses['students_id'], sycStudentClasses.index)]
 
+        return Frames.upsert([(keys, cleverEnrollments)], columns)
 
     def generateUsers(self):
-        sdsUsers = pandas.DataFrame(columns=[
+        columns = [
             'Email',
             'First Name',
             'Last Name',
             'Phone',
             'SIS ID',
-            ])
-
-        for index, sycFamilyContact in self.sycamore.get('family_contacts').iterrows():
-            # Email, First Name and Last Name are required in SDS, so skip contacts without it
-            if (sycFamilyContact['PrimaryParent'] != 1
-                or not sycFamilyContact['Email']
-                or not sycFamilyContact['FirstName']
-                or not sycFamilyContact['LastName']):
-                continue
-
-            sdsUsers = self._appendUser(sdsUsers, index, sycFamilyContact, 'WorkPhone')
-            sdsUsers = self._appendUser(sdsUsers, index, sycFamilyContact, 'HomePhone')
-            sdsUsers = self._appendUser(sdsUsers, index, sycFamilyContact, 'CellPhone')
-
-        return sdsUsers.drop_duplicates()
+            ]
+
+        # Email, First Name and Last Name are required in SDS, so skip contacts without it
+        sycFamilyContacts = self._primaryContacts()
+        sycFamilyContacts = sycFamilyContacts.loc[Frames.truthy(sycFamilyContacts['FirstName']).to_numpy()
+                                                  & Frames.truthy(sycFamilyContacts['LastName']).to_numpy()]
+
+        # One user per contact and phone number, in the order of the contacts
+        # and then of the phone fields.
+        phoneFields = ['WorkPhone', 'HomePhone', 'CellPhone']
+        contactOrder = numpy.arange(len(sycFamilyContacts.index))
+        phones = pandas.concat([
+            pandas.DataFrame({
+                'contactId': sycFamilyContacts.index,
+                'phoneField': field,
+                'phone': sycFamilyContacts[field].to_numpy(),
+                'contactOrder': contactOrder,
+                'fieldOrder': fieldOrder,
+                })
+            for fieldOrder, field in enumerate(phoneFields)])
+        phones = phones.loc[Frames.truthy(phones['phone']).to_numpy()].sort_values(
+            by=['contactOrder', 'fieldOrder'])
+        contacts = sycFamilyContacts.iloc[phones['contactOrder'].to_numpy()]
+
+        sdsUsers = pandas.DataFrame({
+            'Email': contacts['Email'].to_numpy(),
+            'First Name': contacts['FirstName'].str.strip().to_numpy(),
+            'Last Name': contacts['LastName'].str.strip().to_numpy(),
+            'Phone': [Generators.createPhoneNumber(phone) for phone in phones['phone']],
+            'SIS ID': phones['contactId'].to_numpy(),
+            })
+        keys = [str(contactId) + "_" + field for contactId, field in zip(phones['contactId'], phones['phoneField'])]
+
+        return Frames.upsert([(keys, sdsUsers)], columns).drop_duplicates()
 
     def generateGuardianRelationships(self):
-        sdsGuardianRelationships = pandas.DataFrame(columns=[
+        columns = [
             'SIS ID', # student ID
             'Email', # contact e-mail
             'Role', # contact role
-            ])
-
-        sycFamilyContacts = self.sycamore.get('family_contacts')
-        sycFamilyStudents = self.sycamore.get('family_students')
-
-        for familyIndex, sycFamily in self.sycamore.get('families').iterrows():
-            for contactIndex, sycFamilyContact in sycFamilyContacts.loc[sycFamilyContacts['families_id'] == familyIndex].iterrows():
-                # Email is the lookup key, so skip contacts without it
-                if not sycFamilyContact['Email'] or sycFamilyContact['PrimaryParent'] != 1:
-                    continue
-
-                for studentIndex in sycFamilyStudents.loc[sycFamilyStudents['families_id'] == familyIndex].index.values:
-                    sdsGuardianRelationship = {}
-                    sdsGuardianRelationship['Email'] = sycFamilyContact['Email']
-                    sdsGuardianRelationship['Role'] = Generators.createRole(sycFamilyContact['Relation'])
-                    sdsGuardianRelationship['SIS ID'] = studentIndex
-
-                    sdsGuardianRelationships.loc[str(studentIndex)+"_"+str(contactIndex)] = (
-                        pandas.Series(data=sdsGuardianRelationship))
-
-        return sdsGuardianRelationships.drop_duplicates()
+            ]
+
+        # Every primary contact of a family is related to every student of the
+        # family, in the order of 'families', then contacts, then students.
+        familyIds = self.sycamore.get('families').index
+        # Email is the lookup key, so skip contacts without it
+        sycFamilyContacts = Frames.orderBy(self._primaryContacts(), 'families_id', familyIds)
+        sycFamilyStudents = Frames.orderBy(self.sycamore.get('family_students'), 'families_id', familyIds)
+        contacts = pandas.DataFrame({
+            'familyId': sycFamilyContacts['families_id'].to_numpy(),
+            'contactId': sycFamilyContacts.index,
+            'email': sycFamilyContacts['Email'].to_numpy(),
+            'relation': sycFamilyContacts['Relation'].to_numpy(),
+            'contactOrder': numpy.arange(len(sycFamilyContacts.index)),
+            })
+        students = pandas.DataFrame({
+            'familyId': sycFamilyStudents['families_id'].to_numpy(),
+            'studentId': sycFamilyStudents.index,
+            'studentOrder': numpy.arange(len(sycFamilyStudents.index)),
+            })
+        pairs = contacts.merge(students, on='familyId').sort_values(by=['contactOrder', 'studentOrder'])
+
+        sdsGuardianRelationships = pandas.DataFrame({
+            'SIS ID': pairs['studentId'].to_numpy(),
+            'Email': pairs['email'].to_numpy(),
+            'Role': Translations.translateSeries('role', pairs['relation']).to_numpy(),
+            })
+        keys = [str(studentId) + "_" + str(contactId) for studentId, contactId in zip(pairs['studentId'], pairs['contactId'])]
+
+        return Frames.upsert([(keys, sdsGuardianRelationships)], columns).drop_duplicates()
 
     def _getSchool(self) -> pandas.core.series.Series:
         sycSchools = self.sycamore.get('school')
@@ -359,9 +344,35 @@ def parse_arguments():
                         required=True, help='Cache directory')
     parser.add_argument('--reload', dest='reload_data', action='store_true',
                         help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
+    parser.add_argument('--memory-map', dest='memory_map', action='append', metavar='ENTITY',
+                        choices=[entity.name for entity in SycamoreCache.ENTITIES],
+                        help='Entity to memory-map when loading the cache from Arrow files, can be repeated '
+                             '(default: {})'.format(', '.join(SycamoreCache.MEMORY_MAP_ENTITIES)))
+    parser.add_argument('--memory-report', dest='memory_report', action='store_true',
+                        help='Whether to print the memory used by each loaded entity')
     parser.add_argument('--out', dest='output_dir', action='store',
                         required=True, help='Output directory')
+    parser.add_argument('--accounts', dest='accounts', action='store',
+                        help='CSV file with the Username and ID of existing accounts')
+    parser.add_argument('--delta', dest='delta_output', action='store_true',
+                        help='Whether to also write the changes since the last delta run, and skip unchanged files')
+    parser.add_argument('--translations', dest='translations', action='store',
+                        help='JSON file with additional grade, term and relationship translations')
     parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
+    parser.set_defaults(memory_report=False)
+    parser.set_defaults(delta_output=False)
     return parser.parse_args()
 
 if __name__ == "__main__" :
@@ -369,5 +380,7 @@ if __name__ == "__main__" :
     args = parse_arguments()
     creator = CleverCreator(args)
     creator.generate()
+    if args.memory_report:
+        creator.sycamore.printMemoryReport()
     print('Done')
 
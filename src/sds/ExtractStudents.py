@@ -10,13 +10,15 @@ import sys
 sys.path.append("..")
 sys.path.append(".")
 
-from lib import Generators
+from lib import Frames
 from lib import SycamoreRest
 from lib import SycamoreCache
+from lib import SycamoreViews
+from lib import Usernames
 
 class StudentCreator:
 
-    def __init__(self, args):
+    def __init__(self, args, sycamore: SycamoreCache.Cache = None, views: SycamoreViews.Views = None):
         self.school_id = args.school_id
         self.cache_dir = args.cache_dir
         self.output_dir = args.output_dir
@@ -26,9 +28,18 @@ class StudentCreator:
         elif not os.path.isdir(self.output_dir):
             raise InvalidOutputDir('output_dir="{}" is not a directory'.format(self.output_dir))
 
-        print('Initializing cache')
-        rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token)
-        self.sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data)
+        if sycamore is None:
+            print('Initializing cache')
+            rest = SycamoreRest.Extract(school_id=self.school_id, token=args.security_token,
+                                        rate=args.rate, burst=args.burst)
+            sycamore = SycamoreCache.Cache(rest=rest, cache_dir=self.cache_dir, reload=args.reload_data,
+                                           refresh=args.refresh_data, resume=args.resume_load,
+                                           memory_map=args.memory_map or SycamoreCache.MEMORY_MAP_ENTITIES)
+        self.sycamore = sycamore
+        if views is None:
+            accounts = Usernames.loadAccounts(args.accounts) if args.accounts else None
+            views = SycamoreViews.Views(self.sycamore, accounts=accounts)
+        self.views = views
 
     def generate(self):
         print('Generating output')
@@ -38,34 +49,23 @@ class StudentCreator:
             index=False)
 
     def generateAzureAdStudents(self):
-        sdsUsers = pandas.DataFrame(columns=[
+        columns = [
             'EmailAddress',
             'SourceId',
             'LastName',
             'FirstName',
-            ])
+            ]
 
         # Add students
-        for index, sycStudent in self.sycamore.get('students').iterrows():
-            sycStudentDetails = self.sycamore.get('student_details').loc[index]
+        sycStudentDetails = self.views.studentDetails()
+        sdsUsers = pandas.DataFrame({
+            'SourceId': self.sycamore.get('students').loc[sycStudentDetails.index, 'StudentCode'].to_numpy(),
+            'EmailAddress': self.views.studentEmails(include_domain=True).to_numpy(),
+            'LastName': sycStudentDetails['LastName'].to_numpy(),
+            'FirstName': sycStudentDetails['FirstName'].to_numpy(),
+            })
 
-            if sycStudentDetails['Grade'] is None:
-                print('Skipping student "{}" with empty grade'.format(index))
-                continue
-
-            emailAddress = Generators.createStudentEmailAddress(
-                sycStudentDetails['FirstName'], sycStudentDetails['LastName'],
-                include_domain=True)
-
-            sdsUser = {}
-            sdsUser['SourceId'] = sycStudent['StudentCode']
-            sdsUser['EmailAddress'] = emailAddress
-            sdsUser['LastName'] = sycStudentDetails['LastName']
-            sdsUser['FirstName'] = sycStudentDetails['FirstName']
-
-            sdsUsers.loc[index] = pandas.Series(data=sdsUser)
-
-        return sdsUsers.drop_duplicates()
+        return Frames.upsert([(sycStudentDetails.index, sdsUsers)], columns).drop_duplicates()
 
 def parse_arguments():
     parser = argparse.ArgumentParser(description='Extract Family and School Data')
@@ -77,9 +77,30 @@ def parse_arguments():
                         required=True, help='Cache directory')
     parser.add_argument('--reload', dest='reload_data', action='store_true',
                         help='Whether to reload data')
+    parser.add_argument('--refresh', dest='refresh_data', action='store_true',
+                        help='Whether to only reload changed data')
+    parser.add_argument('--resume', dest='resume_load', action='store_true',
+                        help='Whether to resume an interrupted download from its checkpoint')
+    parser.add_argument('--rate', dest='rate', action='store',
+                        type=float, default=SycamoreRest.DEFAULT_RATE,
+                        help='Maximum number of Sycamore requests per second, 0 for no limit')
+    parser.add_argument('--burst', dest='burst', action='store',
+                        type=int, default=SycamoreRest.DEFAULT_BURST,
+                        help='Number of Sycamore requests that may be sent at once within the rate')
+    parser.add_argument('--memory-map', dest='memory_map', action='append', metavar='ENTITY',
+                        choices=[entity.name for entity in SycamoreCache.ENTITIES],
+                        help='Entity to memory-map when loading the cache from Arrow files, can be repeated '
+                             '(default: {})'.format(', '.join(SycamoreCache.MEMORY_MAP_ENTITIES)))
+    parser.add_argument('--memory-report', dest='memory_report', action='store_true',
+                        help='Whether to print the memory used by each loaded entity')
     parser.add_argument('--out', dest='output_dir', action='store',
                         required=True, help='Output directory')
+    parser.add_argument('--accounts', dest='accounts', action='store',
+                        help='CSV file with the Username and ID of existing accounts')
     parser.set_defaults(reload_data=False)
+    parser.set_defaults(refresh_data=False)
+    parser.set_defaults(resume_load=False)
+    parser.set_defaults(memory_report=False)
     return parser.parse_args()
 
 if __name__ == "__main__" :
@@ -87,5 +108,7 @@ if __name__ == "__main__" :
     args = parse_arguments()
     creator = StudentCreator(args)
     creator.generate()
+    if args.memory_report:
+        creator.sycamore.printMemoryReport()
     print('Done')
 
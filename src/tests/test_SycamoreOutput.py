@@ -0,0 +1,56 @@
+import os
+import pandas
+import sys
+import tempfile
+import unittest
+
+# append the path of the parent directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from lib import SycamoreOutput
+
+class DeltaTest(unittest.TestCase):
+
+    def setUp(self):
+        self.output_dir = tempfile.TemporaryDirectory()
+        self.users = pandas.DataFrame({'id': [1, 2, 3], 'name': ['Anna', 'Ben', 'Clara']})
+
+    def tearDown(self):
+        self.output_dir.cleanup()
+
+    def _generate(self) -> dict:
+        users = self.users
+        return SycamoreOutput.generate_all([
+            SycamoreOutput.Output('users.csv', lambda: users),
+            SycamoreOutput.StreamingOutput('streamed.csv', lambda: iter([users.iloc[:2], users.iloc[2:]])),
+            ], self.output_dir.name, delta=True)
+
+    def _path(self, *names) -> str:
+        return os.path.join(self.output_dir.name, *names)
+
+    def testTwoRunsFromEmptyOutputDir(self):
+        first = self._generate()
+        for file_name in ('users.csv', 'streamed.csv'):
+            self.assertEqual(first[file_name]['added'], 3)
+            self.assertFalse(first[file_name]['unchanged'])
+            self.assertTrue(os.path.exists(self._path(SycamoreOutput.FINGERPRINT_DIR, file_name + '.json')))
+            pandas.testing.assert_frame_equal(pandas.read_csv(self._path(file_name)), self.users)
+        self.assertNotIn('users.csv.json.tmp', os.listdir(self._path(SycamoreOutput.FINGERPRINT_DIR)))
+
+        second = self._generate()
+        for file_name in ('users.csv', 'streamed.csv'):
+            self.assertTrue(second[file_name]['unchanged'])
+            self.assertEqual(second[file_name]['added'] + second[file_name]['changed'] + second[file_name]['removed'], 0)
+        summary = pandas.read_csv(self._path(SycamoreOutput.DELTA_DIR, SycamoreOutput.DELTA_SUMMARY_FILE))
+        self.assertTrue(summary['unchanged'].all())
+
+    def testChangedAndRemovedRows(self):
+        self._generate()
+        self.users = pandas.DataFrame({'id': [1, 2, 4], 'name': ['Anna', 'Benjamin', 'David']})
+        result = self._generate()['users.csv']
+        self.assertEqual((result['added'], result['changed'], result['removed']), (1, 1, 1))
+        removed = pandas.read_csv(self._path(SycamoreOutput.DELTA_DIR, 'users.removed.csv'))
+        self.assertEqual(removed['id'].tolist(), [3])
+
+if __name__ == '__main__':
+    unittest.main()